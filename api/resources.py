@@ -0,0 +1,110 @@
+"""
+Ресурсы JSON API.
+
+Ресурс описывает, какие поля модели отдаются клиенту и какие связанные объекты можно
+подгрузить параметром include. Из базы читаются только запрошенные параметром fields
+столбцы (через only()), а связанные объекты каждого вида загружаются одним запросом
+для всей страницы.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import FileField
+
+from posts.models import Post, Group, Comment, Follow
+from users.models import UserProfile
+
+User = get_user_model()
+
+
+class ApiError(Exception):
+    """Ошибка в параметрах запроса к API; отдается клиенту с кодом 400."""
+
+
+class Resource:
+    """
+    Ресурс API поверх модели.
+    includes задает для имени связанного объекта кортеж (имя ресурса, атрибут этого объекта
+    со значением ключа, поле связанной модели, по которому он ищется).
+    """
+
+    def __init__(self, name, model, fields, includes=None):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.includes = includes or {}
+
+    def parse_fields(self, value):
+        """Возвращает список полей из параметра fields; id отдается всегда."""
+        if not value:
+            return list(self.fields)
+        fields = [name for name in value.split(',') if name]
+        unknown = [name for name in fields if name not in self.fields]
+        if unknown:
+            raise ApiError(f'Неизвестные поля ресурса {self.name}: {", ".join(unknown)}')
+        return ['id'] + [name for name in fields if name != 'id']
+
+    def parse_includes(self, value):
+        names = [name for name in (value or '').split(',') if name]
+        unknown = [name for name in names if name not in self.includes]
+        if unknown:
+            raise ApiError(f'Ресурс {self.name} не может подгрузить: {", ".join(unknown)}')
+        return names
+
+    def only(self, fields, includes=()):
+        """Возвращает имена полей модели для only(): запрошенные поля и ключи подгружаемых объектов."""
+        names = set(fields)
+        for include in includes:
+            names.add(self.model._meta.get_field(self.includes[include][1]).name)
+        return names
+
+    def value(self, obj, name):
+        field = self.model._meta.get_field(name)
+        if field.is_relation:
+            return getattr(obj, field.attname)
+        if isinstance(field, FileField):
+            file = getattr(obj, name)
+            return file.url if file else None
+        return getattr(obj, name)
+
+    def serialize(self, obj, fields):
+        return {name: self.value(obj, name) for name in fields}
+
+    def load_included(self, objects, includes):
+        """Загружает связанные объекты страницы: по одному запросу на каждый вид."""
+        included = {}
+        for include in includes:
+            resource_name, attname, target = self.includes[include]
+            resource = RESOURCES[resource_name]
+            keys = {getattr(obj, attname) for obj in objects} - {None}
+            if not keys:
+                continue
+            fields = resource.parse_fields(None)
+            related = resource.model.objects.filter(**{f'{target}__in': keys}).only(*fields)
+            items = included.setdefault(resource_name, {})
+            for obj in related:
+                items[obj.pk] = resource.serialize(obj, fields)
+        return {name: list(items.values()) for name, items in included.items()}
+
+
+RESOURCES = {
+    resource.name: resource for resource in (
+        Resource(
+            'posts', Post,
+            ('id', 'text', 'pub_date', 'author', 'group', 'image', 'comment_count', 'likes_count', 'dislikes_count'),
+            includes={'author': ('users', 'author_id', 'id'), 'group': ('groups', 'group_id', 'id')},
+        ),
+        Resource('groups', Group, ('id', 'title', 'slug', 'description', 'image')),
+        Resource(
+            'comments', Comment, ('id', 'post', 'author', 'text', 'created'),
+            includes={'author': ('users', 'author_id', 'id'), 'post': ('posts', 'post_id', 'id')},
+        ),
+        Resource(
+            'follows', Follow, ('id', 'user', 'author'),
+            includes={'user': ('users', 'user_id', 'id'), 'author': ('users', 'author_id', 'id')},
+        ),
+        Resource(
+            'users', User, ('id', 'username', 'first_name', 'last_name'),
+            includes={'profile': ('profiles', 'id', 'user')},
+        ),
+        Resource('profiles', UserProfile, ('id', 'user', 'foto', 'posts_count', 'followers_count', 'following_count')),
+    )
+}
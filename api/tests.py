@@ -0,0 +1,126 @@
+import datetime
+import decimal
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, Group, Comment, Follow
+from . import views
+
+User = get_user_model()
+
+
+class TestApi(TestCase):
+    """Набор тестов для проверки JSON API."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('writer', first_name='Антон')
+        self.reader = User.objects.create_user('reader')
+        self.group = Group.objects.create(title='Новости', slug='news', description='Последние')
+        self.posts = [
+            Post.objects.create(author=self.author, group=self.group if number % 2 else None, text=f'пост {number}')
+            for number in range(5)
+        ]
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'api-v1:{name}', args=args), params)
+
+    @override_settings(API_PAGE_SIZE=2)
+    def test_pages(self):
+        """Тестирует постраничный вывод по курсору."""
+        texts = []
+        url = reverse('api-v1:posts')
+        while url:
+            data = self.client.get(url).json()
+            texts.extend(post['text'] for post in data['data'])
+            url = data['next']
+        self.assertEqual(texts, [f'пост {number}' for number in reversed(range(5))])
+
+        data = self.get('posts', group='news').json()
+        self.assertEqual([post['text'] for post in data['data']], ['пост 3', 'пост 1'])
+        self.assertIsNone(data['next'])
+        self.assertEqual(self.get('posts', cursor='broken').status_code, 404)
+
+    def test_fields(self):
+        """Тестирует отдачу только запрошенных полей и чтение только нужных столбцов."""
+        response = self.get('posts', fields='text')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(set(response.json()['data'][0]), {'id', 'text'})
+
+        response = self.get('posts', fields='text,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+        with self.assertNumQueries(1) as queries:
+            self.get('post', self.posts[0].pk, fields='text')
+        self.assertNotIn('likes_count', queries.captured_queries[0]['sql'])
+
+    def test_include(self):
+        """Тестирует подгрузку связанных объектов одним запросом на каждый вид."""
+        Comment.objects.bulk_create(
+            Comment(post=self.posts[1], author=user, text='комментарий') for user in (self.author, self.reader) * 3
+        )
+        cache.clear()
+        # комментарии, их авторы и сам пост для проверки его существования
+        with self.assertNumQueries(3):
+            data = self.get('comments', self.posts[1].pk, include='author').json()
+        self.assertEqual(len(data['data']), 6)
+        self.assertEqual(sorted(user['username'] for user in data['included']['users']), ['reader', 'writer'])
+
+        data = self.get('post', self.posts[1].pk, include='author,group').json()
+        self.assertEqual(data['included']['groups'][0]['slug'], 'news')
+        self.assertEqual(self.get('posts', include='comments').status_code, 400)
+
+    def test_users(self):
+        """Тестирует профили пользователей и подписки."""
+        data = self.get('user', self.author.username, include='profile').json()
+        self.assertEqual(data['data']['first_name'], 'Антон')
+        self.assertEqual(data['included']['profiles'][0]['posts_count'], 5)
+        self.assertEqual(data['included']['profiles'][0]['followers_count'], 1)
+
+        data = self.get('followers', self.author.username, include='user').json()
+        self.assertEqual([user['username'] for user in data['included']['users']], ['reader'])
+        data = self.get('following', self.reader.username).json()
+        self.assertEqual(data['data'][0]['author'], self.author.pk)
+
+        # новая подписка меняет счетчик подписок в профиле подписавшегося пользователя
+        response = self.get('user', self.reader.username, include='profile')
+        self.assertEqual(response.json()['included']['profiles'][0]['following_count'], 1)
+        Follow.objects.create(user=self.reader, author=User.objects.create_user('another'))
+        response = self.client.get(
+            reverse('api-v1:user', args=[self.reader.username]), {'include': 'profile'},
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.json()['included']['profiles'][0]['following_count'], 2)
+
+        response = self.get('user', 'nobody')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+    def test_not_modified(self):
+        """Тестирует ответ 304 до изменения данных."""
+        response = self.get('groups')
+        self.assertEqual(response.json()['data'][0]['title'], 'Новости')
+        response = self.client.get(reverse('api-v1:groups'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_dumps(self):
+        """Тестирует, что формат дат в ответе не зависит от наличия orjson."""
+        data = {
+            'pub_date': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1),
+            'rating': decimal.Decimal('1.5'),
+            'text': 'Привет',
+        }
+        expected = b'{"pub_date": "2024-05-01T12:30:15.123Z", "day": "2024-05-01", "rating": "1.5", '
+        with patch.object(views, 'orjson', None):
+            fallback = views.dumps(data)
+        self.assertEqual(fallback, expected + '"text": "Привет"}'.encode())
+        if views.orjson is not None:
+            self.assertEqual(json.loads(views.dumps(data)), json.loads(fallback))
@@ -0,0 +1,15 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.PostListView.as_view(), name='posts'),
+    path('posts/<int:post_id>/', views.PostDetailView.as_view(), name='post'),
+    path('posts/<int:post_id>/comments/', views.CommentListView.as_view(), name='comments'),
+    path('groups/', views.GroupListView.as_view(), name='groups'),
+    path('groups/<slug:slug>/', views.GroupDetailView.as_view(), name='group'),
+    path('users/<username>/', views.UserDetailView.as_view(), name='user'),
+    path('users/<username>/followers/', views.FollowListView.as_view(direction='followers'), name='followers'),
+    path('users/<username>/following/', views.FollowListView.as_view(direction='following'), name='following'),
+]
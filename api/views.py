@@ -0,0 +1,203 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+from django.views.generic.base import View
+
+from posts import invalidation
+from posts.models import Post, Group, Comment, Follow
+from posts.pagination import CursorPaginator, CommentPaginator, IdPaginator
+from posts.utils import get_group
+from posts.views import ConditionalMixin
+from .resources import RESOURCES, ApiError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+User = get_user_model()
+
+
+def dumps(data):
+    """Сериализует ответ в JSON; orjson заметно быстрее стандартного модуля, если он установлен."""
+    if orjson is not None:
+        # даты и время форматирует DjangoJSONEncoder, чтобы ответ не зависел от наличия orjson
+        return orjson.dumps(data, default=DjangoJSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+class ApiView(ConditionalMixin, View):
+    """
+    Базовое представление API, отдающее один объект ресурса.
+
+    Параметр fields задает через запятую отдаваемые поля, include - подгружаемые связанные
+    объекты, которые возвращаются в разделе included. Ошибки отдаются в JSON.
+    """
+    resource_name = None
+
+    @property
+    def resource(self):
+        return RESOURCES[self.resource_name]
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Http404 as e:
+            return json_response({'error': str(e) or 'Не найдено'}, status=404)
+        except ApiError as e:
+            return json_response({'error': str(e)}, status=400)
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_object(self, queryset):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        fields = self.resource.parse_fields(request.GET.get('fields'))
+        includes = self.resource.parse_includes(request.GET.get('include'))
+        queryset = self.get_queryset().only(*self.resource.only(fields, includes))
+        obj = self.get_object(queryset)
+        return json_response({
+            'data': self.resource.serialize(obj, fields),
+            'included': self.resource.load_included([obj], includes),
+        })
+
+
+class ApiListView(ApiView):
+    """Базовое представление API, отдающее список объектов ресурса страницами по курсору."""
+    paginator_class = IdPaginator
+
+    def get(self, request, *args, **kwargs):
+        fields = self.resource.parse_fields(request.GET.get('fields'))
+        includes = self.resource.parse_includes(request.GET.get('include'))
+        # поля ключа страницы нужны для курсора, даже если клиент их не запросил
+        only = self.resource.only(fields, includes) | {self.paginator_class.date_field, 'id'}
+        paginator = self.paginator_class(self.get_queryset().only(*only), settings.API_PAGE_SIZE)
+        page = paginator.page(request.GET.get('cursor'))
+
+        next_url = None
+        if page.has_next():
+            query = request.GET.copy()
+            query['cursor'] = page.next_cursor
+            next_url = f'{request.path}?{query.urlencode()}'
+        return json_response({
+            'data': [self.resource.serialize(obj, fields) for obj in page],
+            'included': self.resource.load_included(page.object_list, includes),
+            'next': next_url,
+        })
+
+
+class PostListView(ApiListView):
+    """Посты, от новых к старым; параметры group и author отбирают посты сообщества или автора."""
+    resource_name = 'posts'
+    paginator_class = CursorPaginator
+
+    def get_invalidation_tags(self):
+        if 'group' in self.request.GET:
+            return [invalidation.group_tag(get_group(self.request.GET['group']).pk)]
+        if 'author' in self.request.GET:
+            return [invalidation.author_tag(self.request.GET['author'])]
+        return [invalidation.POSTS]
+
+    def get_queryset(self):
+        posts = Post.objects.all()
+        if 'group' in self.request.GET:
+            posts = posts.filter(group__slug=self.request.GET['group'])
+        if 'author' in self.request.GET:
+            posts = posts.filter(author__username=self.request.GET['author'])
+        return posts
+
+
+class PostDetailView(ApiView):
+    resource_name = 'posts'
+
+    def get_invalidation_tags(self):
+        # имя автора и сообщество поста меняют метку posts, оценки и комментарии - метку поста
+        return [invalidation.POSTS, invalidation.post_tag(self.kwargs['post_id'])]
+
+    def get_queryset(self):
+        return Post.objects.all()
+
+    def get_object(self, queryset):
+        return get_object_or_404(queryset, pk=self.kwargs['post_id'])
+
+
+class CommentListView(ApiListView):
+    """Комментарии поста, от старых к новым."""
+    resource_name = 'comments'
+    paginator_class = CommentPaginator
+
+    def get_invalidation_tags(self):
+        return [invalidation.post_tag(self.kwargs['post_id'])]
+
+    def get_queryset(self):
+        get_object_or_404(Post.objects.only('pk'), pk=self.kwargs['post_id'])
+        return Comment.objects.filter(post_id=self.kwargs['post_id'])
+
+
+class GroupListView(ApiListView):
+    resource_name = 'groups'
+
+    def get_invalidation_tags(self):
+        return [invalidation.GROUPS]
+
+    def get_queryset(self):
+        return Group.objects.all()
+
+
+class GroupDetailView(ApiView):
+    resource_name = 'groups'
+
+    def get_invalidation_tags(self):
+        return [invalidation.GROUPS]
+
+    def get_queryset(self):
+        return Group.objects.all()
+
+    def get_object(self, queryset):
+        return get_object_or_404(queryset, slug=self.kwargs['slug'])
+
+
+class UserDetailView(ApiView):
+    """Пользователь; с include=profile - вместе с профилем и счетчиками."""
+    resource_name = 'users'
+
+    def get_invalidation_tags(self):
+        return [invalidation.author_tag(self.kwargs['username'])]
+
+    def get_queryset(self):
+        return User.objects.all()
+
+    def get_object(self, queryset):
+        return get_object_or_404(queryset, username=self.kwargs['username'])
+
+
+class FollowListView(ApiListView):
+    """Подписчики пользователя (followers) или его подписки (following)."""
+    resource_name = 'follows'
+    direction = None
+
+    @cached_property
+    def user(self):
+        return get_object_or_404(User.objects.only('pk', 'username'), username=self.kwargs['username'])
+
+    def get_invalidation_tags(self):
+        # подписка меняет метку автора и метку подписавшегося пользователя
+        if self.direction == 'followers':
+            return [invalidation.author_tag(self.kwargs['username'])]
+        return [invalidation.user_tag(self.user.pk)]
+
+    def get_queryset(self):
+        if self.direction == 'followers':
+            return Follow.objects.filter(author=self.user)
+        return Follow.objects.filter(user=self.user)
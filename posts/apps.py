@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import create_index
+        from yatube.database import configure_sqlite, create_missing_indexes
+        connection_created.connect(configure_sqlite)
+        post_migrate.connect(create_index, sender=self)
+        post_migrate.connect(create_missing_indexes, sender=self)
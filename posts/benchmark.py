@@ -0,0 +1,237 @@
+"""
+Нагрузочное тестирование лент, профилей и страниц постов.
+
+seed создает синтетический набор данных: популярность авторов распределена по закону Ципфа,
+поэтому и подписчики, и посты сосредоточены у небольшой доли пользователей, как на живом сайте.
+run прогоняет сценарии через тестовый клиент Django в том же процессе (тогда считаются и SQL-запросы)
+или через HTTP к запущенному серверу, а summarize и compare сводят замеры в перцентили
+и сравнивают их с сохраненным эталоном.
+"""
+import itertools
+import random
+import time
+from datetime import timedelta
+from urllib.request import urlopen
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from yatube import concurrency
+from yatube.profiling import percentile
+from . import bulk
+from .models import Group, Post
+
+User = get_user_model()
+
+SCENARIOS = ('index', 'follow_index', 'group-posts', 'profile', 'post', 'add_comment')
+# сценарии, которым нужен авторизованный пользователь; через HTTP они не выполняются
+AUTH_SCENARIOS = ('follow_index', 'add_comment')
+# сколько объектов каждого вида выбирается для построения адресов запросов
+SAMPLE_SIZE = 1000
+
+
+def zipf_weights(count, exponent):
+    """Возвращает накопленные веса рангов 1..count по закону Ципфа для random.choices."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def seed(users, posts, groups, follows, comments, exponent=1.1, days=365, random_seed=0, progress_factory=None,
+         **import_options):
+    """
+    Добавляет в базу синтетических пользователей, сообщества, посты, подписки и комментарии.
+    Записи создаются генераторами и загружаются пачками, поэтому объем памяти не зависит от их числа.
+    progress_factory(набор данных) возвращает объект bulk.Progress, параметры import_options
+    передаются в bulk.import_rows.
+    """
+    rnd = random.Random(random_seed)
+    now = timezone.now()
+    first_user, first_group, first_post = next_id(User), next_id(Group), next_id(Post)
+    user_ids = range(first_user, first_user + users)
+    group_ids = range(first_group, first_group + groups)
+    post_ids = range(first_post, first_post + posts)
+    popularity = zipf_weights(users, exponent)
+
+    def popular_user():
+        return rnd.choices(user_ids, cum_weights=popularity)[0]
+
+    def random_date():
+        return now - timedelta(seconds=rnd.uniform(0, days * 24 * 60 * 60))
+
+    user_rows = (
+        {'id': pk, 'username': f'user{pk}', 'password': '!', 'date_joined': now}
+        for pk in user_ids
+    )
+    group_rows = (
+        {'id': pk, 'title': f'Сообщество {pk}', 'slug': f'group-{pk}', 'description': f'Описание сообщества {pk}'}
+        for pk in group_ids
+    )
+    post_rows = (
+        {
+            'id': pk,
+            'text': f'Синтетический пост {pk}',
+            'pub_date': random_date(),
+            'author_id': popular_user(),
+            'group_id': rnd.choice(group_ids) if groups and rnd.random() < 0.5 else None,
+        }
+        for pk in post_ids
+    )
+
+    def follow_rows():
+        # в среднем follows подписок на пользователя, чаще всего на популярных авторов
+        per_user = follows / max(users, 1)
+        for user_id in user_ids:
+            count = min(int(rnd.expovariate(1 / per_user)) if per_user else 0, users - 1)
+            authors = set()
+            while len(authors) < count:
+                author_id = popular_user()
+                if author_id != user_id:
+                    authors.add(author_id)
+            for author_id in authors:
+                yield {'user_id': user_id, 'author_id': author_id}
+
+    comment_rows = (
+        {
+            'post_id': rnd.choice(post_ids),
+            'author_id': rnd.choice(user_ids),
+            'text': f'Синтетический комментарий {number}',
+            'created': now,
+        }
+        for number in range(comments)
+    )
+
+    for dataset, rows in (
+        ('users', user_rows),
+        ('groups', group_rows),
+        ('posts', post_rows if users else ()),
+        ('follows', follow_rows()),
+        ('comments', comment_rows if users and posts else ()),
+    ):
+        progress = progress_factory(dataset) if progress_factory else None
+        bulk.import_rows(dataset, rows, progress=progress, **import_options)
+
+
+class Targets:
+    """Случайные существующие объекты, из которых строятся адреса запросов сценариев."""
+
+    def __init__(self, rnd):
+        self.rnd = rnd
+        self.usernames = list(
+            User.objects.filter(posts__isnull=False).distinct().order_by('?')
+            .values_list('username', flat=True)[:SAMPLE_SIZE]
+        )
+        self.followers = list(
+            User.objects.filter(follower__isnull=False).distinct().order_by('?')[:SAMPLE_SIZE]
+        )
+        self.slugs = list(Group.objects.order_by('?').values_list('slug', flat=True)[:SAMPLE_SIZE])
+        self.posts = list(
+            Post.objects.order_by('?').values_list('author__username', 'pk')[:SAMPLE_SIZE]
+        )
+
+    def available(self, scenario):
+        return {
+            'index': True,
+            'follow_index': bool(self.followers),
+            'group-posts': bool(self.slugs),
+            'profile': bool(self.usernames),
+            'post': bool(self.posts),
+            'add_comment': bool(self.posts and self.followers),
+        }[scenario]
+
+    def request(self, scenario):
+        """Возвращает (метод, адрес, данные, пользователь) для очередного запроса сценария."""
+        choice = self.rnd.choice
+        if scenario == 'index':
+            return 'get', reverse('index'), None, None
+        if scenario == 'follow_index':
+            return 'get', reverse('follow_index'), None, choice(self.followers)
+        if scenario == 'group-posts':
+            return 'get', reverse('group-posts', args=[choice(self.slugs)]), None, None
+        if scenario == 'profile':
+            return 'get', reverse('profile', args=[choice(self.usernames)]), None, None
+        if scenario == 'post':
+            return 'get', reverse('post', args=choice(self.posts)), None, None
+        return 'post', reverse('add_comment', args=choice(self.posts)), {'text': 'Комментарий под нагрузкой'}, \
+            choice(self.followers)
+
+
+def run(scenarios, requests, base_url=None, random_seed=0):
+    """
+    Выполняет по requests запросов каждого сценария.
+    Возвращает словарь {сценарий: (список длительностей в мс, список количеств SQL-запросов, общее время в с)}.
+    При запросах через HTTP к base_url количество SQL-запросов не известно и не заполняется.
+    """
+    targets = Targets(random.Random(random_seed))
+    client = Client()
+    results = {}
+    for scenario in scenarios:
+        if not targets.available(scenario) or (base_url and scenario in AUTH_SCENARIOS):
+            continue
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, url, data, user = targets.request(scenario)
+            if base_url:
+                start = time.perf_counter()
+                with urlopen(base_url.rstrip('/') + url) as response:
+                    response.read()
+                latencies.append((time.perf_counter() - start) * 1000)
+                continue
+
+            if user is not None:
+                client.force_login(user)
+            executed = []
+
+            def counter(execute, sql, params, many, context):
+                # запросы выполняются и в потоках пула concurrency
+                executed.append(sql)
+                return execute(sql, params, many, context)
+
+            with concurrency.execute_wrapper(counter):
+                start = time.perf_counter()
+                getattr(client, method)(url, data)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(executed))
+            if user is not None:
+                client.logout()
+        results[scenario] = (latencies, queries, time.perf_counter() - started)
+    return results
+
+
+def summarize(results):
+    """Сводит замеры каждого сценария в перцентили длительности, количество запросов и пропускную способность."""
+    summary = {}
+    for scenario, (latencies, queries, elapsed) in results.items():
+        latencies = sorted(latencies)
+        summary[scenario] = {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'rps': round(len(latencies) / max(elapsed, 1e-6), 1),
+            'queries_max': max(queries) if queries else None,
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance=0.2):
+    """
+    Возвращает список регрессий относительно эталона: p95 выросла больше чем на tolerance
+    или количество SQL-запросов стало больше, чем в эталоне.
+    """
+    regressions = []
+    for scenario, stats in summary.items():
+        expected = baseline.get(scenario)
+        if not expected:
+            continue
+        if stats['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{scenario}: p95 {stats["p95_ms"]} мс, в эталоне {expected["p95_ms"]} мс')
+        if None not in (stats['queries_max'], expected['queries_max']) and stats['queries_max'] > expected['queries_max']:
+            regressions.append(f'{scenario}: {stats["queries_max"]} SQL-запросов, в эталоне {expected["queries_max"]}')
+    return regressions
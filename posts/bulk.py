@@ -0,0 +1,177 @@
+"""
+Потоковые выгрузка и загрузка данных в форматах JSON Lines и CSV.
+
+Записи читаются и пишутся генераторами, а выгрузка идет через iterator(), поэтому объем памяти
+не зависит от объема данных. Загрузка выполняется пачками через bulk_create, каждая пачка -
+в своей транзакции; пачки могут загружаться параллельно несколькими потоками.
+
+bulk_create не отправляет сигналы post_save, поэтому после загрузки счетчики, ленты подписок
+и поисковый индекс нужно пересчитать (команда import_data делает это сама).
+"""
+import csv
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+
+from .models import Group, Post, Comment, Follow, Reaction
+
+User = get_user_model()
+
+# выгружаемые поля моделей; порядок наборов данных соответствует порядку загрузки
+DATASETS = {
+    'users': (User, ('id', 'username', 'first_name', 'last_name', 'email', 'password', 'is_active', 'date_joined')),
+    'groups': (Group, ('id', 'title', 'slug', 'description', 'image')),
+    'posts': (Post, ('id', 'text', 'pub_date', 'author_id', 'group_id', 'image')),
+    'comments': (Comment, ('id', 'post_id', 'author_id', 'text', 'created')),
+    'follows': (Follow, ('id', 'user_id', 'author_id')),
+    'reactions': (Reaction, ('id', 'post_id', 'user_id', 'value')),
+}
+
+FORMATS = ('jsonl', 'csv')
+
+
+def chunked(iterable, size):
+    """Разбивает поток на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Progress:
+    """Выводит количество обработанных записей и скорость обработки."""
+
+    def __init__(self, write, label):
+        self.write = write
+        self.label = label
+        self.count = 0
+        self.start = time.monotonic()
+
+    @property
+    def rate(self):
+        return self.count / max(time.monotonic() - self.start, 1e-6)
+
+    def update(self, count):
+        self.count += count
+        self.write(f'{self.label}: {self.count} записей, {self.rate:.0f} записей/с')
+
+
+class Encoder(DjangoJSONEncoder):
+    # в отличие от DjangoJSONEncoder даты сохраняются с микросекундами, как в базе
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_rows(dataset, chunk_size=1000):
+    """Возвращает генератор записей набора данных в виде словарей."""
+    model, fields = DATASETS[dataset]
+    return model.objects.order_by('pk').values(*fields).iterator(chunk_size=chunk_size)
+
+
+def write_jsonl(rows, stream):
+    for row in rows:
+        stream.write(json.dumps(row, cls=Encoder, ensure_ascii=False))
+        stream.write('\n')
+        yield row
+
+
+def write_csv(rows, stream, fields):
+    writer = csv.DictWriter(stream, fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: '' if value is None else value for key, value in row.items()})
+        yield row
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def build(model, row):
+    """Создает объект модели из записи, приводя строковые значения к типам полей."""
+    values = {}
+    for name, value in row.items():
+        field = model._meta.get_field(name)
+        if value == '' and field.null:
+            # в CSV отсутствующее значение записывается пустой строкой
+            value = None
+        values[field.attname] = field.to_python(value)
+    return model(**values)
+
+
+@contextmanager
+def keep_dates(model):
+    """Отключает auto_now_add у полей модели, чтобы загружаемые даты не заменялись текущими."""
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def insert_chunk(model, rows, ignore_conflicts):
+    with transaction.atomic():
+        model.objects.bulk_create([build(model, row) for row in rows], ignore_conflicts=ignore_conflicts)
+    return len(rows)
+
+
+def insert_chunk_in_worker(model, rows, ignore_conflicts):
+    try:
+        return insert_chunk(model, rows, ignore_conflicts)
+    finally:
+        connections.close_all()
+
+
+def import_rows(dataset, rows, chunk_size=1000, workers=1, ignore_conflicts=False, progress=None):
+    """
+    Загружает записи набора данных пачками по chunk_size записей.
+    При workers > 1 пачки загружаются параллельно, но в памяти одновременно находится
+    не больше 2 * workers пачек.
+    """
+    model, fields = DATASETS[dataset]
+
+    def report(count):
+        if progress:
+            progress.update(count)
+
+    with keep_dates(model):
+        if workers <= 1:
+            for chunk in chunked(rows, chunk_size):
+                report(insert_chunk(model, chunk, ignore_conflicts))
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import') as executor:
+                running = set()
+                for chunk in chunked(rows, chunk_size):
+                    if len(running) >= 2 * workers:
+                        done, running = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            report(future.result())
+                    running.add(executor.submit(insert_chunk_in_worker, model, chunk, ignore_conflicts))
+                for future in running:
+                    report(future.result())
+
+    # записи загружаются со своими id, поэтому последовательности первичных ключей нужно сдвинуть
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
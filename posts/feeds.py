@@ -0,0 +1,257 @@
+import datetime
+import io
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.defaultfilters import linebreaksbr
+from django.urls import reverse
+from django.utils import feedgenerator
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
+from django.utils.timezone import utc
+from django.utils.xmlutils import SimplerXMLGenerator
+from django.views.generic.base import View
+
+from . import invalidation
+from .models import Post
+from .utils import memoize, get_group
+from .views import ConditionalMixin
+
+User = get_user_model()
+
+
+class StreamingFeedMixin:
+    """Примесь для лент django.utils.feedgenerator, записывающая документ по одному элементу."""
+    item_element = None
+
+    def latest_post_date(self):
+        # время последнего изменения известно по меткам, а посты еще не прочитаны
+        return self.feed['updated']
+
+    def make_item(self, **kwargs):
+        """Возвращает элемент ленты со значениями по умолчанию, не сохраняя его в ленте."""
+        self.add_item(**kwargs)
+        return self.items.pop()
+
+    def start(self, handler):
+        raise NotImplementedError
+
+    def end(self, handler):
+        raise NotImplementedError
+
+    def stream(self, items):
+        buffer = io.StringIO()
+        handler = SimplerXMLGenerator(buffer, 'utf-8')
+
+        def flush():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+
+        handler.startDocument()
+        self.start(handler)
+        yield flush()
+        for item in items:
+            handler.startElement(self.item_element, self.item_attributes(item))
+            self.add_item_elements(handler, item)
+            handler.endElement(self.item_element)
+            yield flush()
+        self.end(handler)
+        yield flush()
+
+
+class AtomFeed(StreamingFeedMixin, feedgenerator.Atom1Feed):
+    item_element = 'entry'
+
+    def start(self, handler):
+        handler.startElement('feed', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        handler.endElement('feed')
+
+
+class RssFeed(StreamingFeedMixin, feedgenerator.Rss201rev2Feed):
+    item_element = 'item'
+
+    def start(self, handler):
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+
+
+class JsonFeed(StreamingFeedMixin, feedgenerator.SyndicationFeed):
+    """Лента в формате JSON Feed 1.1 (https://jsonfeed.org/version/1.1)."""
+    content_type = 'application/feed+json; charset=utf-8'
+
+    def stream(self, items):
+        head = json.dumps({
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': self.feed['title'],
+            'home_page_url': self.feed['link'],
+            'feed_url': self.feed['feed_url'],
+            'description': self.feed['description'],
+            'language': self.feed['language'],
+        }, ensure_ascii=False)
+        yield head[:-1] + ', "items": ['
+        for number, item in enumerate(items):
+            entry = {
+                'id': item['unique_id'],
+                'url': item['link'],
+                'title': item['title'],
+                'content_html': item['description'],
+                'date_published': item['pubdate'].isoformat(),
+                'authors': [{'name': item['author_name'], 'url': item['author_link']}],
+                'tags': item['categories'],
+            }
+            yield (', ' if number else '') + json.dumps(entry, ensure_ascii=False)
+        yield ']}'
+
+
+FORMATS = {'atom': AtomFeed, 'rss': RssFeed, 'json': JsonFeed}
+
+
+def cache_stream(key, stamps, chunks):
+    """Передает части документа дальше и сохраняет документ в кэш, если он был записан целиком."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, (stamps, ''.join(parts)), settings.FEED_CACHE_TIMEOUT)
+
+
+class FeedView(ConditionalMixin, View):
+    """Базовое представление ленты Atom, RSS или JSON Feed (параметр format) для сайта, сообщества или автора."""
+    description = ''
+
+    def get_scope(self):
+        """Возвращает имя области ленты для ключа кэша."""
+        raise NotImplementedError
+
+    def get_title(self):
+        raise NotImplementedError
+
+    def get_link(self):
+        raise NotImplementedError
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_items(self, feed, base_url):
+        posts = (
+            self.get_queryset()
+            .select_related('author', 'group')
+            .only(
+                'id', 'text', 'pub_date', 'author', 'group',
+                'author__username', 'author__first_name', 'author__last_name', 'group__title',
+            )
+            .order_by('-pub_date', '-id')[:settings.FEED_ITEMS]
+        )
+        for post in posts.iterator():
+            link = base_url + reverse('post', args=[post.author.username, post.pk])
+            yield feed.make_item(
+                title=Truncator(post.text).chars(80),
+                link=link,
+                description=linebreaksbr(post.text, autoescape=True),
+                author_name=post.author.get_full_name() or post.author.username,
+                author_link=base_url + reverse('profile', args=[post.author.username]),
+                pubdate=post.pub_date,
+                unique_id=link,
+                categories=[post.group.title] if post.group else [],
+            )
+
+    def get(self, request, *args, **kwargs):
+        name = request.GET.get('format', 'atom')
+        feed_class = FORMATS.get(name)
+        if feed_class is None:
+            raise Http404('Неизвестный формат ленты')
+
+        # ссылки в ленте абсолютные, поэтому у каждого адреса сайта своя копия в кэше
+        key = f'feed:{request.scheme}://{request.get_host()}:{self.get_scope()}:{name}'
+        stamps = request.invalidation_stamps
+        cached = cache.get(key)
+        if cached is not None and cached[0] == stamps:
+            return HttpResponse(cached[1], content_type=feed_class.content_type)
+
+        base_url = request.build_absolute_uri('/').rstrip('/')
+        feed = feed_class(
+            title=self.get_title(),
+            link=base_url + self.get_link(),
+            description=self.description,
+            feed_url=request.build_absolute_uri(request.path) + ('' if name == 'atom' else f'?format={name}'),
+            language='ru',
+            updated=datetime.datetime.fromtimestamp(max(stamps), utc),
+        )
+        # посты читаются через iterator() и пишутся в ответ по одному: ни queryset, ни документ целиком
+        # в памяти не собираются, а записанный документ сохраняется в кэш
+        chunks = cache_stream(key, stamps, feed.stream(self.get_items(feed, base_url)))
+        return StreamingHttpResponse(chunks, content_type=feed_class.content_type)
+
+
+class IndexFeed(FeedView):
+    description = 'Последние записи Yatube'
+
+    def get_invalidation_tags(self):
+        return [invalidation.POSTS]
+
+    def get_scope(self):
+        return 'index'
+
+    def get_title(self):
+        return 'Последние обновления'
+
+    def get_link(self):
+        return reverse('index')
+
+    def get_queryset(self):
+        return Post.objects.all()
+
+
+class GroupFeed(FeedView):
+    def get_group(self):
+        return memoize(self.request, get_group, self.kwargs['slug'])
+
+    def get_invalidation_tags(self):
+        return [invalidation.group_tag(self.get_group().pk)]
+
+    def get_scope(self):
+        return f'group:{self.get_group().pk}'
+
+    def get_title(self):
+        return f'Записи сообщества {self.get_group().title}'
+
+    def get_link(self):
+        return reverse('group-posts', args=[self.kwargs['slug']])
+
+    def get_queryset(self):
+        return Post.objects.filter(group=self.get_group())
+
+
+class AuthorFeed(FeedView):
+    @cached_property
+    def author(self):
+        return get_object_or_404(User, username=self.kwargs['username'])
+
+    def get_invalidation_tags(self):
+        return [invalidation.author_tag(self.kwargs['username'])]
+
+    def get_scope(self):
+        return f'author:{self.kwargs["username"]}'
+
+    def get_title(self):
+        return f'Записи пользователя {self.author.get_full_name() or self.author.username}'
+
+    def get_link(self):
+        return reverse('profile', args=[self.kwargs['username']])
+
+    def get_queryset(self):
+        return Post.objects.filter(author=self.author)
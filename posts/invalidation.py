@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIX = 'stamp:'
+
+# метки страниц, не зависящих от конкретного объекта
+POSTS = 'posts'
+TRENDING = 'trending'
+GROUPS = 'groups'
+FLATPAGES = 'flatpages'
+
+
+def group_tag(group_id):
+    return f'group:{group_id}'
+
+
+def author_tag(username):
+    return f'author:{username}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def user_tag(user_id):
+    """Метка данных, которые видит только сам пользователь: его оценки и подписки."""
+    return f'user:{user_id}'
+
+
+def touch(*tags):
+    """Отмечает, что страницы с метками tags изменились."""
+    def update():
+        now = time.time()
+        cache.set_many({PREFIX + tag: now for tag in tags}, None)
+
+    update()
+    # после фиксации транзакции метки обновляются еще раз: иначе страница, отрисованная до фиксации
+    # по старым данным, но под новыми временами меток, осталась бы в кэше
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(update)
+
+
+def touch_post(post):
+    """Отмечает изменение страниц, на которых виден пост."""
+    group_ids = {post.group_id, getattr(post, 'loaded_group_id', None)} - {None}
+    touch(
+        POSTS,
+        post_tag(post.pk),
+        author_tag(post.author.username),
+        *(group_tag(group_id) for group_id in group_ids)
+    )
+
+
+def stamps(tags):
+    """Возвращает времена последнего изменения меток одним запросом к кэшу; новые метки изменились только что."""
+    found = cache.get_many([PREFIX + tag for tag in tags])
+    missing = {PREFIX + tag: time.time() for tag in tags if PREFIX + tag not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[PREFIX + tag] for tag in tags]
+
+
+def validators(request, tags):
+    """Возвращает ETag, время последнего изменения страницы с метками tags и времена самих меток."""
+    tags = list(tags)
+    # страница авторизованного пользователя зависит еще и от его собственной метки
+    if request.user.is_authenticated:
+        tags.append(user_tag(request.user.pk))
+    values = stamps(tags)
+    key = '|'.join([request.get_full_path(), str(request.user.pk or '')] + [repr(value) for value in values])
+    etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+    return etag, max(values), values
@@ -0,0 +1,92 @@
+import threading
+
+from django.core.cache import cache
+from django.core.signals import request_started, request_finished
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import get_module_class
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+_local = threading.local()
+_missing = object()
+
+
+def prefetched():
+    """Возвращает словарь значений, загруженных заранее в рамках текущего запроса."""
+    if not hasattr(_local, 'values'):
+        _local.values = {}
+    return _local.values
+
+
+def reset_prefetched(**kwargs):
+    _local.values = {}
+
+
+request_started.connect(reset_prefetched)
+request_finished.connect(reset_prefetched)
+
+
+class CacheKVStore(KVStoreBase):
+    """
+    Хранилище метаданных миниатюр sorl.thumbnail в кэше вместо базы данных.
+
+    Метаданные изображений хранятся в компактном виде - кортежем (имя файла, хранилище, ширина,
+    высота), причем хранилище по умолчанию не записывается. Метод prefetch загружает метаданные
+    всех миниатюр страницы одним запросом get_many, после чего поиск миниатюр при отрисовке
+    шаблонов обходится без обращений к кэшу.
+
+    Перечислять ключи кэш не умеет, поэтому команды thumbnail cleanup и clear ничего не делают;
+    вытесненные из кэша метаданные sorl.thumbnail восстанавливает по уже созданным файлам.
+    """
+
+    @staticmethod
+    def encode(value, identity):
+        if identity != 'image':
+            return value
+        storage = value.serialize_storage()
+        if storage == thumbnail_settings.THUMBNAIL_STORAGE:
+            storage = None
+        return value.name, storage, value.width, value.height
+
+    @staticmethod
+    def decode(value, identity):
+        if identity != 'image':
+            return value
+        name, storage, width, height = value
+        image_file = ImageFile(name, default.storage if storage is None else get_module_class(storage)())
+        image_file.set_size((width, height))
+        return image_file
+
+    def prefetch(self, keys):
+        """Загружает метаданные изображений с ключами keys одним запросом к кэшу."""
+        raw_keys = [add_prefix(key) for key in keys]
+        values = prefetched()
+        found = cache.get_many([raw_key for raw_key in raw_keys if raw_key not in values])
+        for raw_key in raw_keys:
+            values.setdefault(raw_key, found.get(raw_key))
+
+    def _get(self, key, identity='image'):
+        raw_key = add_prefix(key, identity)
+        value = prefetched().get(raw_key, _missing)
+        if value is _missing:
+            value = cache.get(raw_key)
+        return None if value is None else self.decode(value, identity)
+
+    def _set(self, key, value, identity='image'):
+        raw_key = add_prefix(key, identity)
+        value = self.encode(value, identity)
+        prefetched()[raw_key] = value
+        cache.set(raw_key, value, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+
+    def _delete(self, key, identity='image'):
+        self._delete_raw(add_prefix(key, identity))
+
+    def _delete_raw(self, *keys):
+        values = prefetched()
+        for key in keys:
+            values.pop(key, None)
+        cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        return []
@@ -0,0 +1,73 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет нагрузочные сценарии по лентам, профилям и постам и выводит перцентили длительности, '
+        'количество SQL-запросов и пропускную способность; умеет сравнивать результат с эталоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*', metavar='scenario',
+            help=f'Сценарии: {", ".join(benchmark.SCENARIOS)}. По умолчанию выполняются все.'
+        )
+        parser.add_argument('--requests', type=int, default=100, help='Сколько запросов выполнять в каждом сценарии')
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000; без него запросы выполняются '
+                 'тестовым клиентом в этом процессе'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора случайных чисел')
+        parser.add_argument(
+            '--baseline', default=os.path.join(settings.BASE_DIR, 'benchmark_baseline.json'),
+            help='Файл с эталонными результатами'
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как эталон')
+        parser.add_argument('--check', action='store_true', help='Завершиться с ошибкой при регрессии относительно эталона')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый относительный рост p95 при проверке, по умолчанию 20%%'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+
+        results = benchmark.run(
+            options['scenarios'] or benchmark.SCENARIOS,
+            options['requests'],
+            base_url=options['url'],
+            random_seed=options['seed'],
+        )
+        summary = benchmark.summarize(results)
+
+        self.stdout.write(f'{"сценарий":<14}{"запросов":>10}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}'
+                          f'{"запр/с":>10}{"SQL":>6}')
+        for scenario, stats in summary.items():
+            queries = '-' if stats['queries_max'] is None else stats['queries_max']
+            self.stdout.write(
+                f'{scenario:<14}{stats["requests"]:>10}{stats["p50_ms"]:>10}{stats["p95_ms"]:>10}'
+                f'{stats["p99_ms"]:>10}{stats["rps"]:>10}{queries:>6}'
+            )
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as stream:
+                json.dump(summary, stream, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Эталон сохранен в {options["baseline"]}'))
+
+        if options['check']:
+            if not os.path.exists(options['baseline']):
+                raise CommandError(f'Файл эталона {options["baseline"]} не найден')
+            with open(options['baseline'], encoding='utf-8') as stream:
+                regressions = benchmark.compare(summary, json.load(stream), options['tolerance'])
+            if regressions:
+                raise CommandError('Обнаружены регрессии:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий относительно эталона нет'))
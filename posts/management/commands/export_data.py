@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает пользователей, сообщества, посты, комментарии, подписки и оценки в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets', nargs='*', metavar='dataset',
+            help=f'Наборы данных для выгрузки: {", ".join(bulk.DATASETS)}. По умолчанию выгружаются все.'
+        )
+        parser.add_argument('--format', choices=bulk.FORMATS, default='jsonl', help='Формат файлов')
+        parser.add_argument('--dir', default='.', help='Каталог, в который записываются файлы <набор>.<формат>')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Сколько записей читать из базы за раз')
+
+    def handle(self, *args, **options):
+        unknown = set(options['datasets']) - set(bulk.DATASETS)
+        if unknown:
+            raise CommandError(f'Неизвестные наборы данных: {", ".join(sorted(unknown))}')
+
+        os.makedirs(options['dir'], exist_ok=True)
+        for dataset in options['datasets'] or bulk.DATASETS:
+            path = os.path.join(options['dir'], f'{dataset}.{options["format"]}')
+            progress = bulk.Progress(self.stdout.write, dataset)
+            rows = bulk.export_rows(dataset, options['chunk_size'])
+
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                if options['format'] == 'csv':
+                    rows = bulk.write_csv(rows, stream, bulk.DATASETS[dataset][1])
+                else:
+                    rows = bulk.write_jsonl(rows, stream)
+                for chunk in bulk.chunked(rows, options['chunk_size']):
+                    progress.update(len(chunk))
+
+            self.stdout.write(self.style.SUCCESS(f'{dataset}: выгружено {progress.count} записей в {path}'))
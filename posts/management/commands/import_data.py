@@ -0,0 +1,61 @@
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает пользователей, сообщества, посты, комментарии, подписки и оценки '
+        'из файлов <набор>.jsonl или <набор>.csv, созданных командой export_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы для загрузки; загружаются в порядке зависимостей')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Сколько записей вставлять за раз')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Сколько потоков загружают пачки параллельно; для SQLite полезен только один'
+        )
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать записи, которые уже есть в базе, чтобы загрузку можно было повторить'
+        )
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать после загрузки счетчики, ленты подписок и поисковый индекс'
+        )
+
+    def handle(self, *args, **options):
+        files = {}
+        for path in options['paths']:
+            dataset, extension = os.path.splitext(os.path.basename(path))
+            if dataset not in bulk.DATASETS or extension[1:] not in bulk.FORMATS:
+                raise CommandError(f'Имя файла {path} должно иметь вид <набор>.<формат>, '
+                                   f'где набор - один из {", ".join(bulk.DATASETS)}, формат - jsonl или csv')
+            files[dataset] = (path, extension[1:])
+
+        for dataset in bulk.DATASETS:
+            if dataset not in files:
+                continue
+            path, file_format = files[dataset]
+            progress = bulk.Progress(self.stdout.write, dataset)
+            with open(path, encoding='utf-8', newline='') as stream:
+                rows = bulk.read_csv(stream) if file_format == 'csv' else bulk.read_jsonl(stream)
+                bulk.import_rows(
+                    dataset, rows,
+                    chunk_size=options['chunk_size'],
+                    workers=options['workers'],
+                    ignore_conflicts=options['ignore_conflicts'],
+                    progress=progress,
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'{dataset}: загружено {progress.count} записей, {progress.rate:.0f} записей/с'
+            ))
+
+        if not options['no_rebuild']:
+            # bulk_create не отправляет сигналы, поэтому производные данные строим заново
+            for command in ('recount_counters', 'rebuild_timelines', 'rebuild_search_index'):
+                call_command(command, stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import search
+from posts.models import Post, Comment, Group
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов, комментариев и сообществ'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stderr.write('Полнотекстовый индекс поддерживается только для SQLite')
+            return
+
+        with transaction.atomic():
+            search.create_index()
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {search.INDEX_TABLE}')
+            for post in Post.objects.only('pk', 'text').iterator():
+                search.index_post(post)
+            for comment in Comment.objects.only('pk', 'post_id', 'text').iterator():
+                search.index_comment(comment)
+            for group in Group.objects.only('pk', 'title', 'description').iterator():
+                search.index_group(group)
+
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет материализованные ленты подписок пользователей'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            follows = Follow.objects.values_list('user_id', 'author_id')
+            for user_id, author_id in follows.iterator():
+                timeline.backfill(user_id, author_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Записей в лентах: {TimelineEntry.objects.count()}'))
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Post, Comment, Follow, Reaction
+from users.models import UserProfile
+
+User = get_user_model()
+
+
+def count_subquery(model, field, outer_field='pk', **filters):
+    """Возвращает подзапрос с количеством объектов model, у которых поле field ссылается на текущую строку."""
+    counts = (
+        model.objects.filter(**{field: OuterRef(outer_field)}, **filters)
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля счетчики комментариев и оценок у постов и счетчики в профилях пользователей'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # новая версия поста сбрасывает карточки в кэше, отрисованные с прежними счетчиками
+            posts = Post.objects.update(
+                comment_count=count_subquery(Comment, 'post'),
+                likes_count=count_subquery(Reaction, 'post', value=Reaction.LIKE),
+                dislikes_count=count_subquery(Reaction, 'post', value=Reaction.DISLIKE),
+                version=F('version') + 1,
+            )
+
+            # у пользователей без профиля счетчики хранить негде - создаем недостающие профили
+            UserProfile.objects.bulk_create(
+                UserProfile(user_id=user_id)
+                for user_id in User.objects.filter(profile__isnull=True).values_list('pk', flat=True)
+            )
+            profiles = UserProfile.objects.update(
+                posts_count=count_subquery(Post, 'author', 'user_id'),
+                followers_count=count_subquery(Follow, 'author', 'user_id'),
+                following_count=count_subquery(Follow, 'user', 'user_id'),
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано постов: {posts}, профилей: {profiles}'))
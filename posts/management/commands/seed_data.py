@@ -0,0 +1,42 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from posts import benchmark, bulk
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями, сообществами, постами, подписками и комментариями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=1000000, help='Общее количество подписок, в среднем')
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности авторов: чем больше, тем сильнее неравенство'
+        )
+        parser.add_argument('--days', type=int, default=365, help='За сколько последних дней публикуются посты')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора случайных чисел')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать после загрузки счетчики, ленты подписок и поисковый индекс'
+        )
+
+    def handle(self, *args, **options):
+        benchmark.seed(
+            options['users'], options['posts'], options['groups'], options['follows'], options['comments'],
+            exponent=options['exponent'],
+            days=options['days'],
+            random_seed=options['seed'],
+            progress_factory=lambda dataset: bulk.Progress(self.stdout.write, dataset),
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+        )
+        if not options['no_rebuild']:
+            for command in ('recount_counters', 'rebuild_timelines', 'rebuild_search_index', 'update_trending'):
+                call_command(command, stdout=self.stdout, stderr=self.stderr)
+        self.stdout.write(self.style.SUCCESS('Синтетические данные созданы'))
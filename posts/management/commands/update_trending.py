@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает популярность недавних постов; запускается периодически, например из cron'
+
+    def handle(self, *args, **options):
+        updated = trending.update_scores()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитана популярность постов: {updated}'))
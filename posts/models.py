@@ -27,13 +27,49 @@ class Post(models.Model):
         verbose_name='Сообщество'
     )
     image = models.ImageField(upload_to='posts/', blank=True, null=True, verbose_name='Иллюстрация')
+    comment_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев')
+    likes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество лайков')
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество дизлайков')
+    # популярность поста, периодически пересчитываемая командой update_trending
+    trending_score = models.FloatField(default=0, editable=False, verbose_name='Популярность')
+    # версия карточки поста: увеличивается при любом изменении, влияющем на ее отображение
+    version = models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия')
+
+    # счетчики изменяются только атомарными UPDATE из posts.signals и posts.trending, поэтому при сохранении
+    # существующего поста их не перезаписываем значениями, прочитанными из базы ранее
+    counter_fields = ('comment_count', 'likes_count', 'dislikes_count', 'trending_score', 'version')
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-trending_score', '-id']),
+            # ленты сообществ и профилей с постраничным выводом по ключу (pub_date, id)
+            models.Index(fields=['group', '-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+        ]
 
     def __str__(self):
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # сообщество, в котором пост был при загрузке: при переносе поста обновляются страницы обоих
+        post.loaded_group_id = post.__dict__.get('group_id')
+        return post
+
+    @property
+    def score(self):
+        return self.likes_count - self.dislikes_count
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', verbose_name='Публикация')
@@ -41,6 +77,9 @@ class Comment(models.Model):
     text = models.TextField(max_length=200, verbose_name='Текст')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
 
+    class Meta:
+        indexes = [models.Index(fields=['post', 'created'])]
+
     def __str__(self):
         return f'@{self.author.username} ({self.created:%Y-%m-%d %H:%M}: {self.text}'
 
@@ -51,14 +90,30 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('user', 'author')
+        # подписчики автора при раскладке постов по лентам читаются из индекса без обращения к таблице
+        indexes = [models.Index(fields=['author', 'user'])]
 
 
 class Reaction(models.Model):
+    LIKE = 1
+    DISLIKE = -1
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions', verbose_name='Публикация')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reactions', verbose_name='Пользователь')
     value = models.SmallIntegerField(
-        choices=[(-1, 'Не нравится'), (1, 'Нравится')],
+        choices=[(DISLIKE, 'Не нравится'), (LIKE, 'Нравится')],
         verbose_name='Оценка')
 
     class Meta:
         unique_together = ('post', 'user')
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок: пост автора, на которого подписан пользователь."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [models.Index(fields=['user', '-pub_date', '-post'])]
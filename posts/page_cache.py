@@ -0,0 +1,61 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.flatpages.views import flatpage
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+
+from . import invalidation
+
+
+def page_cache_key(request):
+    # в адрес входят протокол и имя сайта: ленты содержат абсолютные ссылки
+    return 'page:' + hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def is_cacheable_request(request):
+    return request.method in ('GET', 'HEAD') and not request.user.is_authenticated
+
+
+def response_stamps(request, flatpage_stamps):
+    """Возвращает метки изменения страницы и их времена до отрисовки или None, если ее кэшировать нельзя."""
+    tags = getattr(request, 'invalidation_tags', None)
+    if tags is not None:
+        return tags, request.invalidation_stamps
+    if request.resolver_match and request.resolver_match.func is flatpage:
+        return [invalidation.FLATPAGES], flatpage_stamps
+    return None
+
+
+class AnonymousPageCacheMiddleware:
+    """Промежуточный слой, отдающий анонимным посетителям страницы из кэша, пока не изменились их метки."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_cacheable_request(request):
+            return self.get_response(request)
+
+        key = page_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            tags, stamps, response = entry
+            if invalidation.stamps(tags) == stamps:
+                return get_conditional_response(request, etag=response.get('ETag'), response=response)
+
+        # время метки простых страниц читается до отрисовки, как и метки остальных страниц:
+        # изменение, сделанное во время отрисовки, не должно попасть в кэш под новыми временами
+        flatpage_stamps = invalidation.stamps([invalidation.FLATPAGES])
+        response = self.get_response(request)
+        stamps = response_stamps(request, flatpage_stamps)
+        if (
+            stamps is not None
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+        ):
+            # времена меток взяты до отрисовки: изменение во время отрисовки сбросит страницу
+            cache.set(key, (*stamps, response), settings.PAGE_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,182 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+from yatube.cache import get_or_compute
+
+
+class CursorPage:
+    """
+    Страница ленты, полученная по курсору.
+
+    В отличие от django.core.paginator.Page не знает ни своего номера, ни общего количества страниц,
+    зато умеет отдавать курсоры для перехода на соседние страницы.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, cursor, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Пагинатор по ключу (pub_date, id), от новых записей к старым.
+
+    Не выполняет COUNT(*) и OFFSET: каждая страница - это выборка по индексу,
+    начиная с ключа последней (или первой) записи соседней страницы.
+    Подклассы могут задать другие поля ключа и порядок по возрастанию.
+    """
+    date_field = 'pub_date'
+    id_field = 'id'
+    descending = True
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @property
+    def ordering(self):
+        sign = '-' if self.descending else ''
+        return f'{sign}{self.date_field}', f'{sign}{self.id_field}'
+
+    def after(self, date, pk, forward=True):
+        """Возвращает выборку записей, идущих после (или, при forward=False, перед) ключа (date, pk)."""
+        # записи идут в порядке от ключа: по убыванию, если идем вперед по убывающему порядку или назад по возрастающему
+        lookup, sign = ('lt', '-') if self.descending == forward else ('gt', '')
+        return (
+            self.queryset
+            .filter(
+                Q(**{f'{self.date_field}__{lookup}': date})
+                | Q(**{self.date_field: date, f'{self.id_field}__{lookup}': pk})
+            )
+            .order_by(f'{sign}{self.date_field}', f'{sign}{self.id_field}')
+        )
+
+    def fetch(self, key=None, forward=True, limit=None):
+        """Возвращает до limit записей, идущих после ключа key = (date, pk), или первые limit записей."""
+        queryset = self.queryset.order_by(*self.ordering) if key is None else self.after(*key, forward=forward)
+        return list(queryset[:limit])
+
+    @staticmethod
+    def dump_key(value):
+        return value.isoformat()
+
+    @staticmethod
+    def load_key(raw):
+        return parse_datetime(raw)
+
+    def encode_cursor(self, direction, item):
+        raw = f'{direction}|{self.dump_key(getattr(item, self.date_field))}|{item.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """Возвращает кортеж (направление, значение ключа, id) или вызывает Http404."""
+        try:
+            direction, date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            date, pk = self.load_key(date), int(pk)
+        except (ValueError, binascii.Error, UnicodeError):
+            raise Http404('Некорректный курсор')
+        if direction not in ('n', 'p') or date is None:
+            raise Http404('Некорректный курсор')
+        return direction, date, pk
+
+    def page(self, cursor=None):
+        if not cursor:
+            items = self.fetch(limit=self.per_page + 1)
+            has_more, items = len(items) > self.per_page, items[:self.per_page]
+            next_cursor = self.encode_cursor('n', items[-1]) if has_more else None
+            return CursorPage(items, '', next_cursor, None)
+
+        direction, date, pk = self.decode_cursor(cursor)
+        if direction == 'n':
+            # записи, идущие после последней записи предыдущей страницы
+            items = self.fetch((date, pk), limit=self.per_page + 1)
+            has_more, items = len(items) > self.per_page, items[:self.per_page]
+            next_cursor = self.encode_cursor('n', items[-1]) if has_more else None
+            previous_cursor = self.encode_cursor('p', items[0]) if items else None
+        else:
+            # записи, идущие перед первой записью следующей страницы, в обратном порядке
+            items = self.fetch((date, pk), forward=False, limit=self.per_page + 1)
+            has_more, items = len(items) > self.per_page, items[:self.per_page][::-1]
+            previous_cursor = self.encode_cursor('p', items[0]) if has_more else None
+            next_cursor = self.encode_cursor('n', items[-1]) if items else None
+        return CursorPage(items, cursor, next_cursor, previous_cursor)
+
+
+class CommentPaginator(CursorPaginator):
+    """Пагинатор комментариев по ключу (created, id), от старых комментариев к новым."""
+    date_field = 'created'
+    descending = False
+
+
+class IdPaginator(CursorPaginator):
+    """Пагинатор по id для записей без даты, от старых записей к новым."""
+    date_field = 'id'
+    descending = False
+    dump_key = staticmethod(str)
+    load_key = staticmethod(int)
+
+
+class CursorPaginationMixin:
+    """
+    Примесь для ListView, включающая постраничный вывод по курсору.
+
+    Старый режим с номерами страниц доступен, если в запросе передан параметр page.
+    Если задан first_page_cache_key, первая страница ленты берется из кэша с защитой
+    от одновременного пересчета и обновляется не реже чем раз в first_page_cache_timeout секунд.
+    Чтобы изменения ленты были видны сразу, get_first_page_cache_key добавляет к ключу
+    времена меток изменения страницы.
+    """
+    cursor_kwarg = 'cursor'
+    first_page_cache_key = None
+    first_page_cache_timeout = 20
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return CursorPaginator(queryset, page_size)
+
+    def get_first_page_cache_key(self):
+        # времена меток прочитаны ConditionalMixin до запроса к базе данных, поэтому страница
+        # в кэше под этим ключом не старше самих меток
+        stamps = getattr(self.request, 'invalidation_stamps', None)
+        if stamps is None:
+            return self.first_page_cache_key
+        return ':'.join([self.first_page_cache_key, *map(repr, stamps)])
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if not cursor and self.first_page_cache_key:
+            page = get_or_compute(self.get_first_page_cache_key(), paginator.page, self.first_page_cache_timeout)
+        else:
+            page = paginator.page(cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,78 @@
+"""
+Оценки постов: лайки и дизлайки.
+
+Количество лайков и дизлайков хранится в самом посте и изменяется атомарными UPDATE: при создании
+оценки и ее удалении вместе с постом или пользователем - из posts.signals, при смене и отмене
+оценки - из react, поэтому лентам не нужно суммировать оценки.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import F
+
+from . import invalidation
+from .models import Post, Reaction
+
+COUNTERS = {Reaction.LIKE: 'likes_count', Reaction.DISLIKE: 'dislikes_count'}
+
+_local = threading.local()
+
+
+def counting_deletes():
+    """Возвращает, изменяет ли react сама счетчики удаляемых сейчас в этом потоке оценок."""
+    return getattr(_local, 'counting', False)
+
+
+def update_counters(post_id, deltas):
+    """Изменяет счетчики оценок поста одним атомарным UPDATE; deltas - словарь {оценка: изменение}."""
+    Post.objects.filter(pk=post_id).update(
+        version=F('version') + 1,
+        **{COUNTERS[value]: F(COUNTERS[value]) + delta for value, delta in deltas.items()}
+    )
+
+
+def react(user, post, value):
+    """
+    Ставит пользователем оценку value посту; повторная такая же оценка ее отменяет.
+    Возвращает итоговую оценку пользователя: 1, -1 или 0, если оценки нет.
+
+    Новая оценка создается через get_or_create, который при одновременной вставке той же пары
+    (пост, пользователь) перехватывает нарушение уникальности и перечитывает запись; счетчики
+    при этом изменяет обработчик сигнала создания. Смена и отмена оценки изменяют запись
+    условным UPDATE или удалением по прежнему значению и изменяют счетчики, только если запись
+    действительно изменилась: из двух одновременных одинаковых запросов счетчики изменит один.
+    """
+    with transaction.atomic():
+        reaction, created = Reaction.objects.get_or_create(post=post, user=user, defaults={'value': value})
+        if created:
+            return value
+
+        if reaction.value == value:
+            # обработчик post_delete не изменяет счетчики: они зависят от того, удалил ли запись этот запрос
+            _local.counting = True
+            try:
+                changed, _ = Reaction.objects.filter(pk=reaction.pk, value=value).delete()
+            finally:
+                _local.counting = False
+            if changed:
+                update_counters(post.pk, {value: -1})
+            result = 0
+        else:
+            changed = Reaction.objects.filter(pk=reaction.pk, value=reaction.value).update(value=value)
+            if changed:
+                update_counters(post.pk, {reaction.value: -1, value: 1})
+            result = value
+
+        if changed:
+            invalidation.touch(invalidation.post_tag(post.pk), invalidation.user_tag(user.pk))
+        return result
+
+
+def user_reactions(user, posts):
+    """Возвращает оценки пользователя для постов одним запросом: словарь {id поста: оценка}."""
+    if not user.is_authenticated:
+        return {}
+    post_ids = [post.pk for post in posts]
+    if not post_ids:
+        return {}
+    return dict(Reaction.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', 'value'))
@@ -0,0 +1,202 @@
+"""
+Полнотекстовый поиск по постам, комментариям и сообществам.
+
+Индекс хранится в виртуальной таблице SQLite FTS5 в основной базе данных. В таблицу попадают
+не исходные тексты, а основы слов, полученные стеммером Портера для русского языка, поэтому
+запрос "богатыри" находит и "богатырь", и "богатырями". Индекс обновляется обработчиками
+сигналов при сохранении и удалении объектов; команда rebuild_search_index строит его заново.
+"""
+import re
+
+from django.db import connection, connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post, Group
+
+INDEX_TABLE = 'posts_search_index'
+
+# rowid записи индекса вычисляется по виду и id объекта: по столбцам UNINDEXED таблица FTS5
+# ищет только полным просмотром, а по rowid - как по первичному ключу
+KINDS = {'post': 1, 'comment': 2, 'group': 3}
+
+# сколько лучших совпадений выбирается из индекса перед группировкой по постам
+CANDIDATES_LIMIT = 1000
+
+WORD_RE = re.compile(r'\w+')
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND_RE = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE_RE = re.compile(r'(с[яь])$')
+ADJECTIVE_RE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE_RE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB_RE = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN_RE = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+RV_RE = re.compile(rf'^(.*?[{VOWELS}])(.*)$')
+DERIVATIONAL_RE = re.compile(rf'.*[^{VOWELS}]+[{VOWELS}].*ость?$')
+DERIVATIONAL_SUFFIX_RE = re.compile(r'ость?$')
+SUPERLATIVE_RE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Возвращает основу слова по алгоритму Портера для русского языка."""
+    word = word.lower().replace('ё', 'е')
+    match = RV_RE.match(word)
+    if not match:
+        return word
+
+    prefix, rv = match.groups()
+    temp = PERFECTIVE_GERUND_RE.sub('', rv, 1)
+    if temp != rv:
+        rv = temp
+    else:
+        rv = REFLEXIVE_RE.sub('', rv, 1)
+        temp = ADJECTIVE_RE.sub('', rv, 1)
+        if temp != rv:
+            rv = PARTICIPLE_RE.sub('', temp, 1)
+        else:
+            temp = VERB_RE.sub('', rv, 1)
+            rv = NOUN_RE.sub('', rv, 1) if temp == rv else temp
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL_RE.match(rv):
+        rv = DERIVATIONAL_SUFFIX_RE.sub('', rv, 1)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE_RE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def stems(text):
+    """Возвращает список основ всех слов текста."""
+    return [stem(word) for word in WORD_RE.findall(text)]
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def create_index(using='default', **kwargs):
+    """Создает таблицу индекса, если ее еще нет. Подключается к сигналу post_migrate."""
+    if connections[using].vendor != 'sqlite':
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5('
+            f'content, kind UNINDEXED, object_id UNINDEXED, post_id UNINDEXED, '
+            f"tokenize='unicode61 remove_diacritics 0')"
+        )
+
+
+def rowid(kind, object_id):
+    return object_id * len(KINDS) + KINDS[kind]
+
+
+def remove(kind, object_id):
+    """Удаляет объект из индекса."""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [rowid(kind, object_id)])
+
+
+def add(kind, object_id, text, post_id=None):
+    """Добавляет объект в индекс, заменяя его прежнюю запись."""
+    if not is_supported():
+        return
+    remove(kind, object_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, content, kind, object_id, post_id) VALUES (%s, %s, %s, %s, %s)',
+            [rowid(kind, object_id), ' '.join(stems(text)), kind, object_id, post_id]
+        )
+
+
+def index_post(post):
+    add('post', post.pk, post.text, post.pk)
+
+
+def index_comment(comment):
+    add('comment', comment.pk, comment.text, comment.post_id)
+
+
+def index_group(group):
+    add('group', group.pk, f'{group.title} {group.description}')
+
+
+def match_expression(query_stems):
+    # каждая основа ищется как префикс: основа запроса может оказаться короче основы в тексте
+    return ' AND '.join(f'"{query_stem}"*' for query_stem in query_stems)
+
+
+def search(query, limit=20):
+    """
+    Ищет посты и сообщества по запросу.
+    Возвращает кортеж из списков найденных постов и сообществ, упорядоченных по релевантности.
+    Пост находится и тогда, когда запросу соответствует один из комментариев к нему.
+    """
+    query_stems = stems(query)
+    if not query_stems:
+        return [], []
+
+    if not is_supported():
+        posts = Post.objects.select_related('author', 'group').filter(text__icontains=query)[:limit]
+        groups = Group.objects.filter(title__icontains=query)[:limit]
+        return list(posts), list(groups)
+
+    expression = match_expression(query_stems)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT post_id, MIN(rank) FROM ('
+            f"  SELECT post_id, rank FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s AND kind IN ('post', 'comment')"
+            f'  ORDER BY rank LIMIT %s'
+            f') GROUP BY post_id ORDER BY 2 LIMIT %s',
+            [expression, CANDIDATES_LIMIT, limit]
+        )
+        post_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            f"SELECT object_id FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s AND kind = 'group' "
+            f'ORDER BY rank LIMIT %s',
+            [expression, limit]
+        )
+        group_ids = [row[0] for row in cursor.fetchall()]
+
+    posts = Post.objects.select_related('author', 'group').in_bulk(post_ids)
+    groups = Group.objects.in_bulk(group_ids)
+    return [posts[pk] for pk in post_ids if pk in posts], [groups[pk] for pk in group_ids if pk in groups]
+
+
+def highlight(text, query, length=300):
+    """
+    Возвращает фрагмент текста длиной около length символов вокруг первого совпадения,
+    в котором слова, совпадающие с запросом по основе, выделены тегом <mark>.
+    """
+    query_stems = stems(query)
+
+    def is_match(word):
+        word_stem = stem(word)
+        return any(word_stem.startswith(query_stem) for query_stem in query_stems)
+
+    matches = [m for m in WORD_RE.finditer(text) if is_match(m.group())]
+    start = max(matches[0].start() - length // 3, 0) if matches else 0
+    end = start + length
+
+    parts, position = [], start
+    for m in matches:
+        if m.start() < start or m.end() > end:
+            continue
+        parts.append(escape(text[position:m.start()]))
+        parts.append(f'<mark>{escape(m.group())}</mark>')
+        position = m.end()
+    parts.append(escape(text[position:end]))
+    snippet = ''.join(parts)
+    return mark_safe(('…' if start > 0 else '') + snippet + ('…' if end < len(text) else ''))
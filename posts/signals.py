@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.contrib.flatpages.models import FlatPage
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from tasks import queue
+from users.models import UserProfile
+from . import invalidation, reactions, search, thumbnails, timeline
+from .models import Post, Group, Comment, Follow, Reaction
+from .utils import post_card_cache_keys, group_cache_key
+
+
+def update_profile_counter(user_id, field, delta):
+    """
+    Атомарно изменяет счетчик в профиле пользователя.
+    Профиль создается только при увеличении счетчика: при каскадном удалении пользователя
+    его профиль может быть уже удален, и создавать его заново нельзя.
+    """
+    with transaction.atomic():
+        if UserProfile.objects.filter(user_id=user_id).update(**{field: F(field) + delta}) or delta < 0:
+            return
+        profile, created = UserProfile.objects.get_or_create(user_id=user_id, defaults={field: delta})
+        if not created:
+            UserProfile.objects.filter(pk=profile.pk).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    queue.enqueue('posts.index_comments', instance.pk)
+    invalidation.touch(invalidation.post_tag(instance.post_id))
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1,
+            version=F('version') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    search.remove('comment', instance.pk)
+    invalidation.touch(invalidation.post_tag(instance.post_id))
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') - 1,
+        version=F('version') + 1
+    )
+
+
+@receiver(post_save, sender=Reaction)
+def reaction_created(sender, instance, created, **kwargs):
+    invalidation.touch(invalidation.post_tag(instance.post_id), invalidation.user_tag(instance.user_id))
+    if created:
+        field = reactions.COUNTERS[instance.value]
+        Post.objects.filter(pk=instance.post_id).update(**{field: F(field) + 1, 'version': F('version') + 1})
+
+
+@receiver(post_delete, sender=Reaction)
+def reaction_deleted(sender, instance, **kwargs):
+    if reactions.counting_deletes():
+        return
+    invalidation.touch(invalidation.post_tag(instance.post_id), invalidation.user_tag(instance.user_id))
+    field = reactions.COUNTERS[instance.value]
+    Post.objects.filter(pk=instance.post_id).update(**{field: F(field) - 1, 'version': F('version') + 1})
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    queue.enqueue('posts.index_posts', instance.pk)
+    thumbnails.schedule(instance.image)
+    invalidation.touch_post(instance)
+    if created:
+        update_profile_counter(instance.author_id, 'posts_count', 1)
+        queue.enqueue('posts.fan_out_posts', instance.pk)
+    else:
+        Post.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.remove('post', instance.pk)
+    invalidation.touch_post(instance)
+    update_profile_counter(instance.author_id, 'posts_count', -1)
+    cache.delete_many(post_card_cache_keys(instance))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    search.index_group(instance)
+    thumbnails.schedule(instance.image)
+    if not created:
+        instance.posts.update(version=F('version') + 1)
+    cache.delete(group_cache_key(instance.slug))
+    # название сообщества выводится в карточках постов во всех лентах
+    invalidation.touch(invalidation.GROUPS, invalidation.POSTS, invalidation.group_tag(instance.pk))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    search.remove('group', instance.pk)
+    cache.delete(group_cache_key(instance.slug))
+    invalidation.touch(invalidation.GROUPS, invalidation.POSTS, invalidation.group_tag(instance.pk))
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, **kwargs):
+    thumbnails.schedule(instance.foto)
+    invalidation.touch(invalidation.author_tag(instance.user.username))
+
+
+def touch_follow(follow):
+    """Отмечает изменение страниц, на которых видна подписка: счетчики есть в профилях обоих пользователей."""
+    invalidation.touch(
+        invalidation.author_tag(follow.author.username),
+        invalidation.author_tag(follow.user.username),
+        invalidation.user_tag(follow.user_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    touch_follow(instance)
+    if created:
+        with transaction.atomic():
+            update_profile_counter(instance.author_id, 'followers_count', 1)
+            update_profile_counter(instance.user_id, 'following_count', 1)
+        queue.enqueue('posts.backfill_timeline', instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    touch_follow(instance)
+    with transaction.atomic():
+        update_profile_counter(instance.author_id, 'followers_count', -1)
+        update_profile_counter(instance.user_id, 'following_count', -1)
+        timeline.trim(instance.user_id, instance.author_id)
+    followers_count = (
+        UserProfile.objects.filter(user_id=instance.author_id).values_list('followers_count', flat=True).first()
+    )
+    if followers_count == settings.FOLLOW_FEED_FANOUT_LIMIT:
+        # посты автора снова раскладываются по лентам: в них нужно добавить пропущенные
+        queue.enqueue('posts.restore_fan_out', instance.author_id)
+
+
+@receiver(post_save, sender=FlatPage)
+@receiver(post_delete, sender=FlatPage)
+def flatpage_changed(sender, instance, **kwargs):
+    invalidation.touch(invalidation.FLATPAGES)
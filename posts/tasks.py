@@ -0,0 +1,45 @@
+"""Фоновые задачи постов: индексация для поиска, раскладка по лентам подписок и миниатюры."""
+from tasks.queue import task
+from . import search, thumbnails, timeline
+from .kvstore import reset_prefetched
+from .models import Post, Comment, Follow
+
+
+@task('posts.index_posts', batch=True, unique=True)
+def index_posts(batch):
+    # пост мог быть удален, пока задача ждала в очереди
+    for post in Post.objects.filter(pk__in=[post_id for post_id, in batch]).only('text'):
+        search.index_post(post)
+
+
+@task('posts.index_comments', batch=True, unique=True)
+def index_comments(batch):
+    for comment in Comment.objects.filter(pk__in=[comment_id for comment_id, in batch]).only('text', 'post_id'):
+        search.index_comment(comment)
+
+
+@task('posts.fan_out_posts', batch=True, unique=True)
+def fan_out_posts(batch):
+    for post in Post.objects.filter(pk__in=[post_id for post_id, in batch]).only('author_id', 'pub_date'):
+        timeline.fan_out_post(post)
+
+
+@task('posts.restore_fan_out', unique=True)
+def restore_fan_out(author_id):
+    timeline.restore_fan_out(author_id)
+
+
+@task('posts.backfill_timeline', unique=True)
+def backfill_timeline(user_id, author_id):
+    # пользователь мог отписаться раньше, чем ему разложили посты автора
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        timeline.backfill(user_id, author_id)
+
+
+@task('posts.generate_thumbnails', unique=True)
+def generate_thumbnails(label, pk, name):
+    try:
+        thumbnails.generate(label, pk, name)
+    finally:
+        # метаданные миниатюр, загруженные для этой задачи, в следующей могут быть уже устаревшими
+        reset_prefetched()
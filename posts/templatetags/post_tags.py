@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import thumbnails
+from posts.utils import render_post_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, comment_button_able=True):
+    return mark_safe(render_post_cards(posts, comment_button_able))
+
+
+@register.simple_tag
+def picture(image, geometry, css_class='', with_margin=False):
+    """Возвращает <picture> с заранее созданными миниатюрами или пустую строку, если они еще не готовы."""
+    return thumbnails.picture(image, geometry, css_class, with_margin)
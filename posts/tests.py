@@ -1,13 +1,26 @@
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from posts.models import Post, Group, Follow, Comment
-from io import BytesIO
+from posts.models import Post, Group, Follow, Comment, Reaction, TimelineEntry
+from datetime import timedelta
+from io import BytesIO, StringIO
 from PIL import Image
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from posts import benchmark, bulk, invalidation, kvstore, page_cache, reactions, search, thumbnails, trending
+from posts.utils import check_following, get_author_post, get_group, post_card_cache_key, render_post_cards
+from users.models import UserProfile
+from yatube import query_budget
+from unittest.mock import patch
+import json
+import os
 import random
 import string
+import tempfile
 
 
 User = get_user_model()
@@ -263,21 +276,16 @@ class TestCache(TestCase):
     def test_index(self):
         """Тестирует кэширование главной страницы."""
         response = self.client.get(self.index_url)
+        self.assertContains(response, self.old_post.text)
 
-        # сейчас на главной странице один пост
-        # создаем еще один пост и снова запрашиваем главную страницу
-        new_post = Post.objects.create(author=self.author, text=self.new_post_text)
+        # новый пост сразу появляется на главной странице, а удаленный сразу пропадает
+        Post.objects.create(author=self.author, text=self.new_post_text)
         response = self.client.get(self.index_url)
+        self.assertContains(response, self.new_post_text)
 
-        # на главной странице пост еще не появился, т.к. кэш возвращает старую версию страницы
-        self.assertNotContains(response, self.new_post_text)
-
-        # очищаем кэш и опять запрашиваем главную страницу
-        cache.clear()
+        self.old_post.delete()
         response = self.client.get(self.index_url)
-
-        # теперь новый пост есть на странице
-        self.assertContains(response, self.new_post_text)
+        self.assertNotContains(response, self.old_post.text)
 
 
 class TestComments(TestCase):
@@ -313,7 +321,37 @@ class TestComments(TestCase):
         expected_url = f'{reverse("login")}?next={self.url_add_comment}'
         self.assertRedirects(response, expected_url)
 
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_pages(self):
+        """Тестирует вывод комментариев страницами по курсору."""
+        cache.clear()
+        created = timezone.now()
+        # у части комментариев одинаковое время создания: порядок между ними задает id
+        comments = Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'комментарий {number}', created=created)
+            for number in range(5)
+        )
+        texts = [comment.text for comment in comments]
+
+        response = self.client.get(reverse('post', args=[self.author.username, self.post.pk]))
+        self.assertEqual([comment.text for comment in response.context['comments']], texts[:2])
+        self.assertNotContains(response, texts[2])
+        next_url = response.context['next_url']
+
+        loaded = []
+        while next_url:
+            data = self.client.get(next_url + '&format=json').json()
+            loaded.extend(text for text in texts if text in data['html'])
+            next_url = data['next']
+        self.assertEqual(loaded, texts[2:])
+
+        response = self.client.get(response.context['next_url'])
+        self.assertContains(response, 'more-comments')
+        response = self.client.get(reverse('post_comments', args=[self.user.username, self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+
 
+@override_settings(TASKS_ASYNC=False)
 class TestFollows(TestCase):
     """Набор тестов для проверки работы системы подписок."""
 
@@ -426,3 +464,905 @@ class TestFollows(TestCase):
         # он перенаправляется на страницу авторизации
         expected_url = f'{reverse("login")}?next={url_unfollow}'
         self.assertRedirects(response, expected_url)
+
+
+class TestPagination(TestCase):
+    """Набор тестов для проверки постраничного вывода по курсору."""
+
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user('chronicler')
+        self.posts = [Post.objects.create(author=self.author, text=f'запись номер {i}') for i in range(25)]
+        # новые записи идут первыми
+        self.posts.reverse()
+        self.url = reverse('profile', args=[self.author.username])
+
+    def test_cursor(self):
+        """Тестирует переходы по страницам вперед и назад по курсорам."""
+        response = self.client.get(self.url)
+        page = response.context['page_obj']
+        self.assertEqual(list(page), self.posts[:5])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+        # проходим всю ленту до конца
+        pages = [page]
+        while page.has_next():
+            response = self.client.get(self.url, {'cursor': page.next_cursor})
+            page = response.context['page_obj']
+            pages.append(page)
+        self.assertEqual([post for page in pages for post in page], self.posts)
+
+        # и возвращаемся назад с последней страницы
+        response = self.client.get(self.url, {'cursor': pages[-1].previous_cursor})
+        page = response.context['page_obj']
+        self.assertEqual(list(page), list(pages[-2]))
+        self.assertContains(response, f'?cursor={page.next_cursor}')
+
+    def test_page_number_fallback(self):
+        """Тестирует режим с номерами страниц."""
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(list(response.context['page_obj']), self.posts[5:10])
+        self.assertContains(response, '?page=5')
+
+    def test_invalid_cursor(self):
+        """Тестирует обращение с некорректным курсором."""
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TestCounters(TestCase):
+    """Набор тестов для проверки денормализованных счетчиков."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('writer')
+        self.reader = User.objects.create_user('reader')
+        self.post = Post.objects.create(author=self.author, text='first')
+        Post.objects.create(author=self.author, text='second')
+        Comment.objects.create(post=self.post, author=self.reader, text='nice')
+        Comment.objects.create(post=self.post, author=self.author, text='thanks')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def assertCounters(self):
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, self.post.comments.count())
+        for user in (self.author, self.reader):
+            profile = UserProfile.objects.get(user=user)
+            self.assertEqual(profile.posts_count, user.posts.count())
+            self.assertEqual(profile.followers_count, user.following.count())
+            self.assertEqual(profile.following_count, user.follower.count())
+
+    def test_signals(self):
+        """Тестирует обновление счетчиков при создании и удалении объектов."""
+        self.assertCounters()
+
+        self.post.comments.first().delete()
+        Follow.objects.all().delete()
+        Post.objects.create(author=self.reader, text='third')
+        self.assertCounters()
+
+        # сохранение поста не перезаписывает счетчик устаревшим значением
+        stale_post = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author=self.reader, text='again')
+        stale_post.text = 'edited'
+        stale_post.save()
+        self.assertCounters()
+
+    def test_atomic_create(self):
+        """Тестирует, что запись не сохраняется, если не удалось обновить ее счетчики."""
+        self.client.force_login(self.reader)
+        with patch('posts.signals.update_profile_counter', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('new_post'), {'text': 'без счетчика'})
+        self.assertFalse(Post.objects.filter(text='без счетчика').exists())
+
+        with patch('posts.signals.invalidation.touch', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('add_comment', args=[self.author.username, self.post.pk]), {'text': 'тоже'})
+        self.assertFalse(Comment.objects.filter(text='тоже').exists())
+        self.assertCounters()
+
+    def test_recount(self):
+        """Тестирует команду пересчета счетчиков."""
+        Post.objects.update(comment_count=100)
+        UserProfile.objects.all().delete()
+        version = Post.objects.get(pk=self.post.pk).version
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCounters()
+        # карточки с прежними счетчиками в кэше больше не используются
+        self.assertEqual(self.post.version, version + 1)
+
+    def test_views(self):
+        """Тестирует вывод счетчиков на страницах."""
+        response = self.client.get(reverse('post', args=[self.author.username, self.post.pk]))
+        self.assertContains(response, 'Комментарии (2)')
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Записей: 2')
+
+        response = self.client.get(reverse('profile', args=[self.author.username]))
+        self.assertContains(response, 'Комментарии (2)')
+
+
+@override_settings(TASKS_ASYNC=False)
+class TestTimeline(TestCase):
+    """Набор тестов для проверки материализованной ленты подписок."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('blogger')
+        self.reader = User.objects.create_user('reader')
+        self.old_post = Post.objects.create(author=self.author, text='written before follow')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        return list(self.client.get(reverse('follow_index')).context['page_obj'])
+
+    def test_fan_out(self):
+        """Тестирует заполнение ленты при подписке, публикации и отписке."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='written after follow')
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+        Follow.objects.get(user=self.reader, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=0)
+    def test_fan_out_on_read(self):
+        """Тестирует ленту с постами популярного автора, которые не раскладываются по лентам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='written after follow')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    def test_pages(self):
+        """Тестирует постраничный вывод ленты по ключу материализованной ленты вместе с постами популярного автора."""
+        star = User.objects.create_user('star')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=star)
+        posts = [self.old_post] + [
+            Post.objects.create(author=star if number % 3 else self.author, text=f'пост {number}')
+            for number in range(24)
+        ]
+        UserProfile.objects.filter(user=star).update(followers_count=settings.FOLLOW_FEED_FANOUT_LIMIT + 1)
+        TimelineEntry.objects.filter(post__author=star).delete()
+
+        expected = sorted(posts, key=lambda post: (post.pub_date, post.pk), reverse=True)
+        feed, cursor = [], None
+        while True:
+            page = self.client.get(reverse('follow_index'), {'cursor': cursor} if cursor else {}).context['page_obj']
+            feed.extend(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(feed, expected)
+
+        previous = self.client.get(reverse('follow_index'), {'cursor': page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(previous), expected[10:20])
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=1)
+    def test_fanout_limit_crossed(self):
+        """Тестирует, что посты, опубликованные сверх порога подписчиков, появляются в лентах после его снижения."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        other = User.objects.create_user('other')
+        Follow.objects.create(user=other, author=self.author)
+        hidden = Post.objects.create(author=self.author, text='written above the limit')
+        self.assertFalse(TimelineEntry.objects.filter(post=hidden).exists())
+        self.assertEqual(self.feed(), [hidden, self.old_post])
+
+        Follow.objects.get(user=other, author=self.author).delete()
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post=hidden).exists())
+        self.assertEqual(self.feed(), [hidden, self.old_post])
+
+    def test_rebuild(self):
+        """Тестирует команду перестроения лент."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), [self.old_post])
+
+
+class TestPostCardCache(TestCase):
+    """Набор тестов для проверки кэширования карточек постов."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user('cached_author')
+        self.group = Group.objects.create(title='Old title', slug='cached_group')
+        self.post = Post.objects.create(author=self.author, text='cached text', group=self.group)
+        self.url = reverse('profile', args=[self.author.username])
+        # страницы авторизованных пользователей не попадают в кэш страниц, поэтому каждый
+        # запрос отрисовывает карточки заново; сами карточки от пользователя не зависят
+        self.client.force_login(self.author)
+
+    def test_versions(self):
+        """Тестирует смену версии карточки при изменениях поста."""
+        self.client.get(self.url)
+        self.assertIn(post_card_cache_key(self.post), cache)
+
+        def assertBumped(version):
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.version, version)
+            self.assertNotIn(post_card_cache_key(self.post), cache)
+
+        self.post.text = 'edited text'
+        self.post.save()
+        assertBumped(2)
+        self.assertContains(self.client.get(self.url), 'edited text')
+
+        Comment.objects.create(post=self.post, author=self.author, text='comment')
+        assertBumped(3)
+        self.assertContains(self.client.get(self.url), 'Комментарии (1)')
+
+        self.group.title = 'New title'
+        self.group.save()
+        assertBumped(4)
+        self.assertContains(self.client.get(self.url), 'New title')
+
+    def test_cached_fragment(self):
+        """Тестирует, что карточка берется из кэша и не зависит от пользователя."""
+        self.client.get(self.url)
+        cache.set(post_card_cache_key(self.post), '<p>from cache</p>')
+        self.assertContains(self.client.get(self.url), 'from cache')
+
+        cache.delete(post_card_cache_key(self.post))
+        self.client.force_login(self.author)
+        response = self.client.get(self.url)
+        self.assertContains(response, f'.post-edit.author-{self.author.pk}')
+        self.assertEqual(cache.get(post_card_cache_key(self.post)), render_post_cards([self.post]))
+
+
+@override_settings(TASKS_ASYNC=False)
+class TestSearch(TestCase):
+    """Набор тестов для проверки полнотекстового поиска."""
+
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user('ilya_muromets')
+        self.group = Group.objects.create(title='Богатырская застава', slug='zastava', description='Сторожим рубежи')
+        self.post = Post.objects.create(author=self.author, text='Три богатыря выехали в чисто поле', group=self.group)
+        self.other = Post.objects.create(author=self.author, text='Змей Горыныч прилетел')
+        self.url = reverse('search')
+
+    def test_stem(self):
+        """Тестирует выделение основ слов."""
+        self.assertEqual(search.stem('богатыри'), search.stem('богатырями'))
+        self.assertEqual(search.stem('выехали'), search.stem('выехал'))
+        self.assertEqual(search.stem('Ёлки'), search.stem('елка'))
+
+    def test_search(self):
+        """Тестирует поиск по постам, комментариям и сообществам."""
+        response = self.client.get(self.url, {'q': 'богатырями'})
+        self.assertEqual([post for post, snippet in response.context['results']], [self.post])
+        self.assertContains(response, '<mark>богатыря</mark>')
+        self.assertEqual(response.context['groups'], [self.group])
+
+        # пост находится по тексту комментария
+        Comment.objects.create(post=self.other, author=self.author, text='Богатыри его победят')
+        posts, groups = search.search('богатырь')
+        self.assertEqual(set(posts), {self.post, self.other})
+
+    def test_incremental_update(self):
+        """Тестирует обновление индекса при изменении и удалении объектов."""
+        self.post.text = 'Поле опустело'
+        self.post.save()
+        self.assertEqual(search.search('богатырь')[0], [])
+        self.assertEqual(search.search('полем опустело')[0], [self.post])
+
+        self.post.delete()
+        self.assertEqual(search.search('поле')[0], [])
+
+    def test_remove_by_rowid(self):
+        """Тестирует удаление из индекса по rowid, не затрагивающее объекты других видов с тем же id."""
+        search.remove('comment', self.post.pk)
+        search.remove('group', self.post.pk)
+        self.assertEqual(search.search('богатырь')[0], [self.post])
+        search.remove('post', self.post.pk)
+        self.assertEqual(search.search('богатырь')[0], [])
+
+    def test_rebuild(self):
+        """Тестирует команду перестроения индекса."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.INDEX_TABLE}')
+        self.assertEqual(search.search('змей')[0], [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search.search('змей')[0], [self.other])
+
+
+class TestThumbnails(TestCase):
+    """Набор тестов для проверки предварительного создания миниатюр."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user('painter')
+        self.client.force_login(self.author)
+
+    def create_post(self):
+        data = BytesIO()
+        Image.new('RGB', (600, 400)).save(data, 'PNG')
+        self.client.post(reverse('new_post'), {
+            'text': 'картина маслом',
+            'image': SimpleUploadedFile('picture.png', data.getvalue()),
+        })
+        return Post.objects.get(author=self.author)
+
+    @override_settings(TASKS_ASYNC=False)
+    def test_pregenerate(self):
+        """Тестирует создание всех стандартных миниатюр при загрузке изображения."""
+        post = self.create_post()
+        for geometry, options in thumbnails.all_variants('posts.post.image'):
+            self.assertIsNotNone(thumbnails.lookup(post.image, geometry, **options))
+
+        # в карточке поста миниатюры отдаются в формате WebP с запасной миниатюрой в исходном формате
+        response = self.client.get(reverse('profile', args=[self.author.username]))
+        webp = thumbnails.lookup(post.image, '640x400', format='WEBP', upscale=False)
+        self.assertTrue(webp.url.endswith('.webp'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'{webp.url} 2x')
+        self.assertContains(response, thumbnails.lookup(post.image, '320x200').url)
+
+        # те же варианты используются для предпросмотра в форме редактирования
+        response = self.client.get(reverse('post_edit', args=[self.author.username, post.pk]))
+        self.assertContains(response, f'{webp.url} 2x')
+
+    @override_settings(TASKS_ASYNC=True)
+    def test_placeholder(self):
+        """Тестирует вывод заглушки, пока миниатюры не созданы."""
+        post = self.create_post()
+        self.assertIsNone(thumbnails.lookup(post.image, '320x200'))
+
+        response = self.client.get(reverse('profile', args=[self.author.username]))
+        self.assertContains(response, 'img/no_image.png')
+
+
+class TestThumbnailStore(TestCase):
+    """Набор тестов для проверки хранения метаданных миниатюр в кэше."""
+
+    def setUp(self):
+        cache.clear()
+        kvstore.reset_prefetched()
+        self.client = Client()
+        self.author = User.objects.create_user('sculptor')
+        self.client.force_login(self.author)
+
+    @override_settings(TASKS_ASYNC=False)
+    def test_prefetch(self):
+        """Тестирует загрузку метаданных всех миниатюр страницы одним запросом к кэшу."""
+        data = BytesIO()
+        Image.new('RGB', (600, 400)).save(data, 'PNG')
+        self.client.post(reverse('new_post'), {
+            'text': 'скульптура из глины',
+            'image': SimpleUploadedFile('statue.png', data.getvalue()),
+        })
+        post = Post.objects.get(author=self.author)
+
+        # метаданные хранятся в кэше компактным кортежем, без хранилища по умолчанию
+        thumbnail = thumbnails.thumbnail_file(post.image, '320x200')
+        name, storage, width, height = cache.get(f'sorl-thumbnail||image||{thumbnail.key}')
+        self.assertEqual((name, storage, width, height), (thumbnail.name, None, 300, 200))
+
+        kvstore.reset_prefetched()
+        with patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            thumbnails.prefetch([post.image])
+        with patch.object(cache, 'get', wraps=cache.get) as get:
+            for geometry, options in thumbnails.all_variants('posts.post.image'):
+                self.assertIsNotNone(thumbnails.lookup(post.image, geometry, **options))
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(get.call_count, 0)
+
+        response = self.client.get(reverse('post', args=[self.author.username, post.pk]))
+        self.assertContains(response, '<source type="image/webp"')
+
+
+class TestReactions(TestCase):
+    """Набор тестов для проверки оценок постов."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('critic')
+        self.reader = User.objects.create_user('fan')
+        self.post = Post.objects.create(author=self.author, text='оцените')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def react(self, name, ajax=True):
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if ajax else {}
+        return self.client.post(reverse(name, args=[self.author.username, self.post.pk]), **headers)
+
+    def test_react(self):
+        """Тестирует постановку, смену и отмену оценки."""
+        response = self.react('post_like')
+        self.assertEqual(response.json(), {'value': 1, 'likes': 1, 'dislikes': 0, 'score': 1})
+
+        response = self.react('post_dislike')
+        self.assertEqual(response.json(), {'value': -1, 'likes': 0, 'dislikes': 1, 'score': -1})
+
+        response = self.react('post_dislike')
+        self.assertEqual(response.json(), {'value': 0, 'likes': 0, 'dislikes': 0, 'score': 0})
+        self.assertFalse(Reaction.objects.exists())
+
+        # без AJAX пользователь возвращается на страницу поста
+        response = self.react('post_like', ajax=False)
+        self.assertRedirects(response, reverse('post', args=[self.author.username, self.post.pk]))
+
+        # оценивать могут только авторизованные пользователи
+        self.client.logout()
+        self.react('post_dislike')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (1, 0))
+
+    def test_concurrent_react(self):
+        """Тестирует, что запрос, опоздавший к уже измененной оценке, не меняет счетчики повторно."""
+        reactions.react(self.reader, self.post, Reaction.LIKE)
+        stale = Reaction.objects.get()
+
+        # другой запрос уже отменил оценку, а этот прочитал ее до отмены
+        reactions.react(self.reader, self.post, Reaction.LIKE)
+        with patch.object(Reaction.objects, 'get_or_create', return_value=(stale, False)):
+            self.assertEqual(reactions.react(self.reader, self.post, Reaction.LIKE), 0)
+            self.assertEqual(reactions.react(self.reader, self.post, Reaction.DISLIKE), Reaction.DISLIKE)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (0, 0))
+
+        # смена оценки - это чтение и одно изменение записи, один UPDATE счетчиков
+        # и две команды точки сохранения вложенной транзакции
+        reactions.react(self.reader, self.post, Reaction.LIKE)
+        with self.assertNumQueries(5):
+            reactions.react(self.reader, self.post, Reaction.DISLIKE)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (0, 1))
+        self.assertEqual(Reaction.objects.get().value, Reaction.DISLIKE)
+
+        # при отмене оценки счетчик уменьшает только react, а не обработчик post_delete
+        self.assertEqual(reactions.react(self.reader, self.post, Reaction.DISLIKE), 0)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (0, 0))
+
+    def test_recount(self):
+        """Тестирует пересчет счетчиков оценок."""
+        Reaction.objects.create(post=self.post, user=self.reader, value=Reaction.LIKE)
+        Reaction.objects.create(post=self.post, user=self.author, value=Reaction.DISLIKE)
+        Post.objects.update(likes_count=10, dislikes_count=10)
+        call_command('recount_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count, self.post.score), (1, 1, 0))
+
+    def test_user_reactions(self):
+        """Тестирует загрузку оценок пользователя для всей страницы одним запросом."""
+        other = Post.objects.create(author=self.author, text='и эту')
+        Post.objects.create(author=self.author, text='а эту не надо')
+        self.react('post_like')
+        Reaction.objects.create(post=other, user=self.reader, value=Reaction.DISLIKE)
+
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            result = reactions.user_reactions(self.reader, posts)
+        self.assertEqual(result, {self.post.pk: 1, other.pk: -1})
+
+        response = self.client.get(reverse('profile', args=[self.author.username]))
+        self.assertEqual(response.context['user_reactions'], {self.post.pk: 1, other.pk: -1})
+        self.assertContains(response, 'id="user-reactions"')
+
+
+class TestTrending(TestCase):
+    """Набор тестов для проверки ленты популярных постов."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('trendsetter')
+        self.reader = User.objects.create_user('follower')
+        self.quiet = Post.objects.create(author=self.author, text='тихий пост')
+        self.hot = Post.objects.create(author=self.author, text='горячий пост')
+        self.old = Post.objects.create(author=self.author, text='старый пост')
+        Post.objects.filter(pk=self.old.pk).update(pub_date=timezone.now() - timedelta(days=30), trending_score=5)
+        Post.objects.filter(pk=self.quiet.pk).update(pub_date=timezone.now() - timedelta(hours=1))
+        Comment.objects.create(post=self.hot, author=self.reader, text='ого')
+        Reaction.objects.create(post=self.hot, user=self.reader, value=Reaction.LIKE)
+
+    def test_update(self):
+        """Тестирует пересчет популярности и порядок постов в ленте."""
+        call_command('update_trending', stdout=StringIO())
+        self.assertEqual(list(trending.top_posts()), [self.hot, self.quiet])
+
+        # популярность затухает со временем
+        now = timezone.now()
+        self.assertGreater(trending.score(now, 0, 0, 0, now), trending.score(now - timedelta(hours=5), 0, 0, 0, now))
+
+        # постраничный вывод по ключу обходится без COUNT(*)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('top'))
+        self.assertEqual(list(response.context['page_obj']), [self.hot, self.quiet])
+        self.assertNotContains(response, 'старый пост')
+
+    def test_pages(self):
+        """Тестирует постраничный вывод популярных постов по курсору, в том числе при равной популярности."""
+        posts = [Post.objects.create(author=self.author, text=f'пост {number}') for number in range(12)]
+        for number, post in enumerate(posts):
+            Post.objects.filter(pk=post.pk).update(trending_score=0.1 * (number // 3) + 0.3)
+        expected = list(trending.top_posts())
+
+        first = self.client.get(reverse('top')).context['page_obj']
+        self.assertEqual(list(first), expected[:10])
+        second = self.client.get(reverse('top'), {'cursor': first.next_cursor}).context['page_obj']
+        self.assertEqual(list(second), expected[10:])
+        self.assertFalse(second.has_next())
+        previous = self.client.get(reverse('top'), {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(previous), expected[:10])
+
+
+class TestBulkData(TestCase):
+    """Набор тестов для проверки потоковых выгрузки и загрузки данных."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('importer', password='secret')
+        self.reader = User.objects.create_user('exporter')
+        group = Group.objects.create(title='Архив', slug='archive', description='старые записи')
+        self.post = Post.objects.create(author=self.author, group=group, text='перенесенный пост')
+        Post.objects.create(author=self.reader, text='пост без сообщества')
+        Post.objects.filter(pk=self.post.pk).update(pub_date=timezone.now() - timedelta(days=100))
+        Comment.objects.create(post=self.post, author=self.reader, text='комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Reaction.objects.create(post=self.post, user=self.reader, value=Reaction.LIKE)
+        self.post.refresh_from_db()
+
+    def transfer(self, file_format, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('export_data', format=file_format, dir=directory, stdout=StringIO())
+            User.objects.all().delete()
+            Group.objects.all().delete()
+            paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+            call_command('import_data', *paths, chunk_size=2, stdout=StringIO(), **options)
+
+    def assertTransferred(self):
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 2)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, self.post.pub_date)
+        self.assertEqual(post.group.slug, 'archive')
+        self.assertEqual((post.comment_count, post.likes_count), (1, 1))
+        self.assertEqual(UserProfile.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 1)
+        self.assertTrue(User.objects.get(username='importer').check_password('secret'))
+        self.assertEqual(search.search('перенесенный')[0], [post])
+
+    def test_jsonl(self):
+        """Тестирует выгрузку и загрузку в формате JSON Lines."""
+        self.transfer('jsonl')
+        self.assertTransferred()
+
+    def test_csv(self):
+        """Тестирует выгрузку и загрузку в формате CSV."""
+        self.transfer('csv')
+        self.assertTransferred()
+        self.assertIsNone(Post.objects.get(text='пост без сообщества').group)
+
+    def test_progress(self):
+        """Тестирует вывод хода загрузки пачками."""
+        progress = StringIO()
+        rows = ({'id': 100 + i, 'title': f'g{i}', 'slug': f'g{i}', 'description': '', 'image': ''} for i in range(5))
+        bulk.import_rows('groups', rows, chunk_size=2, progress=bulk.Progress(progress.write, 'groups'))
+        self.assertEqual(Group.objects.count(), 6)
+        self.assertIn('groups: 5 записей', progress.getvalue())
+
+
+class TestBenchmark(TestCase):
+    """Набор тестов для проверки синтетических данных и нагрузочных сценариев."""
+
+    def test_benchmark(self):
+        """Тестирует заполнение базы, прогон сценариев и сравнение с эталоном."""
+        call_command(
+            'seed_data', users=30, posts=200, groups=3, follows=60, comments=50, chunk_size=50, stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 50)
+        # популярные авторы собирают больше подписчиков
+        self.assertGreater(UserProfile.objects.order_by('-followers_count').first().followers_count, 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            output = StringIO()
+            call_command('benchmark', requests=5, baseline=baseline, save_baseline=True, check=True, stdout=output)
+            for scenario in benchmark.SCENARIOS:
+                self.assertIn(scenario, output.getvalue())
+            self.assertEqual(Comment.objects.count(), 55)
+
+            with open(baseline) as stream:
+                stored = json.load(stream)
+            stored['post']['queries_max'] = 1
+            with open(baseline, 'w') as stream:
+                json.dump(stored, stream)
+            with self.assertRaisesMessage(CommandError, 'post: '):
+                call_command('benchmark', 'post', requests=5, baseline=baseline, check=True, stdout=StringIO())
+
+
+@override_settings(QUERY_BUDGET_CHECK=True, QUERY_BUDGET_STRICT=True)
+class TestQueryBudgets(TestCase):
+    """Набор тестов для проверки бюджетов SQL-запросов представлений."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('budget')
+        self.reader = User.objects.create_user('auditor')
+        self.group = Group.objects.create(title='Бюджет', slug='budget', description='расходы')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+
+    def fill(self, count):
+        for number in range(count):
+            post = Post.objects.create(author=self.author, group=self.group, text=f'расход {number}')
+            Comment.objects.create(post=post, author=self.reader if number % 2 else self.author, text='дорого')
+            Reaction.objects.create(post=post, user=self.reader, value=Reaction.LIKE)
+        return post
+
+    def visit(self, post):
+        for name, args in (
+            ('index', []),
+            ('top', []),
+            ('follow_index', []),
+            ('group-posts', [self.group.slug]),
+            ('groups', []),
+            ('profile', [self.author.username]),
+            ('post', [self.author.username, post.pk]),
+            ('post_comments', [self.author.username, post.pk]),
+        ):
+            cache.clear()
+            self.assertEqual(self.client.get(reverse(name, args=args)).status_code, 200)
+        self.client.get(reverse('search'), {'q': 'расход'})
+        self.client.post(reverse('add_comment', args=[self.author.username, post.pk]), {'text': 'еще'})
+        self.client.post(reverse('post_dislike', args=[self.author.username, post.pk]))
+
+    def test_budgets(self):
+        """Тестирует, что количество запросов не зависит от количества объектов на странице."""
+        call_command('update_trending', stdout=StringIO())
+        self.visit(self.fill(3))
+        self.visit(self.fill(30))
+
+    def test_duplicates(self):
+        """Тестирует вывод повторяющихся сигнатур запросов при превышении бюджета."""
+        post = self.fill(2)
+        with override_settings(QUERY_BUDGETS={'post': 1}):
+            with self.assertRaisesMessage(query_budget.QueryBudgetExceeded, 'post: выполнено'):
+                self.client.get(reverse('post', args=[self.author.username, post.pk]))
+
+        # запросы потокового ответа выполняются при отправке содержимого и тоже входят в бюджет
+        self.client.logout()
+        with override_settings(QUERY_BUDGETS={'feed': 0}):
+            response = self.client.get(reverse('feed'))
+            with self.assertRaisesMessage(query_budget.QueryBudgetExceeded, 'feed: выполнено 1 SQL-запросов'):
+                b''.join(response.streaming_content)
+
+        queries = [
+            'SELECT * FROM "users_userprofile" WHERE "user_id" = 1',
+            "SELECT * FROM \"users_userprofile\" WHERE \"user_id\" = 25 AND name = 'x'",
+            'SELECT * FROM "users_userprofile" WHERE "user_id" = %s',
+            'SELECT * FROM "posts_post" WHERE "id" IN (%s, %s)',
+        ]
+        self.assertEqual(query_budget.duplicates(queries), [
+            ('SELECT * FROM "users_userprofile" WHERE "user_id" = ?', 2),
+        ])
+        self.assertEqual(query_budget.signature(queries[3]), 'SELECT * FROM "posts_post" WHERE "id" IN (...)')
+
+
+class TestLookups(TestCase):
+    """Набор тестов для проверки запоминания объектов в пределах запроса."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('memo')
+        self.reader = User.objects.create_user('reminder')
+        self.group = Group.objects.create(title='Память', slug='memory', description='запомнить')
+        self.post = Post.objects.create(author=self.author, group=self.group, text='не забыть')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+
+    def test_group(self):
+        """Тестирует однократное получение сообщества за запрос."""
+        with patch('posts.views.get_group', wraps=get_group) as lookup:
+            self.client.get(reverse('group-posts', args=[self.group.slug]))
+        self.assertEqual(lookup.call_count, 1)
+
+    def test_post(self):
+        """Тестирует получение поста, автора, профиля, сообщества и подписки одним запросом."""
+        with self.assertNumQueries(1):
+            post = get_author_post(self.author.username, self.post.pk, self.reader)
+            self.assertEqual((post.group.slug, post.author.count_of_posts), ('memory', 1))
+            self.assertTrue(check_following(self.reader, post.author))
+
+        response = self.client.get(reverse('post', args=[self.author.username, self.post.pk]))
+        self.assertTrue(response.context['following'])
+        # пост другого автора по этому адресу не открывается
+        response = self.client.get(reverse('post', args=[self.reader.username, self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestConditional(TestCase):
+    """Набор тестов для проверки условных запросов к страницам."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('etag')
+        self.group = Group.objects.create(title='Заголовки', slug='headers', description='HTTP')
+        self.post = Post.objects.create(author=self.author, group=self.group, text='ответ 304')
+        self.urls = {
+            'index': reverse('index'),
+            'group': reverse('group-posts', args=[self.group.slug]),
+            'profile': reverse('profile', args=[self.author.username]),
+            'post': reverse('post', args=[self.author.username, self.post.pk]),
+        }
+
+    def etags(self):
+        return {name: self.client.get(url)['ETag'] for name, url in self.urls.items()}
+
+    def test_not_modified(self):
+        """Тестирует ответ 304 без запросов к базе данных и заголовки кэширования."""
+        response = self.client.get(self.urls['post'])
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.ANONYMOUS_CACHE_MAX_AGE}')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls['post'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.urls['index'], {'page': 2}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertNotEqual(response.status_code, 304)
+
+        self.client.force_login(self.author)
+        response = self.client.get(self.urls['index'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_invalidation(self):
+        """Тестирует смену ETag только у страниц, затронутых изменением."""
+        etags = self.etags()
+        Comment.objects.create(post=self.post, author=self.author, text='изменение')
+        changed = self.etags()
+        self.assertNotEqual(changed['post'], etags['post'])
+        self.assertEqual({name: changed[name] for name in ('index', 'group', 'profile')},
+                         {name: etags[name] for name in ('index', 'group', 'profile')})
+
+        self.post.text = 'новый текст'
+        self.post.save()
+        self.assertTrue(all(etag != changed[name] for name, etag in self.etags().items()))
+
+
+class TestPageCache(TestCase):
+    """Набор тестов для проверки кэша страниц анонимных посетителей."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('pages')
+        self.group = Group.objects.create(title='Страницы', slug='pages', description='Кэш')
+        self.post = Post.objects.create(author=self.author, group=self.group, text='старый текст')
+        self.urls = {
+            'index': reverse('index'),
+            'group': reverse('group-posts', args=[self.group.slug]),
+            'profile': reverse('profile', args=[self.author.username]),
+            'post': reverse('post', args=[self.author.username, self.post.pk]),
+        }
+        for url in self.urls.values():
+            self.client.get(url)
+
+    def cached(self):
+        """Возвращает имена страниц, которые отдаются из кэша без отрисовки."""
+        names = set()
+        for name, url in self.urls.items():
+            with patch('posts.page_cache.response_stamps', wraps=page_cache.response_stamps) as rendered:
+                self.client.get(url)
+            if not rendered.called:
+                names.add(name)
+        return names
+
+    def test_cached(self):
+        """Тестирует отдачу страницы из кэша и ответ 304 на условный запрос к ней."""
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls['post'])
+        self.assertContains(response, 'старый текст')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls['post'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalidation(self):
+        """Тестирует сброс только тех страниц, на которых видно изменение."""
+        self.assertEqual(self.cached(), set(self.urls))
+        Comment.objects.create(post=self.post, author=self.author, text='комментарий')
+        self.assertEqual(self.cached(), {'index', 'group', 'profile'})
+
+        self.post.text = 'новый текст'
+        self.post.save()
+        self.assertEqual(self.cached(), set())
+        for url in self.urls.values():
+            self.assertContains(self.client.get(url), 'новый текст')
+
+    def test_new_post(self):
+        """Тестирует, что новый пост сразу виден анонимным посетителям на закэшированных лентах."""
+        self.assertEqual(self.cached(), set(self.urls))
+        Post.objects.create(author=self.author, group=self.group, text='свежий пост')
+        for name in ('index', 'group', 'profile'):
+            self.assertContains(self.client.get(self.urls[name]), 'свежий пост')
+        # страница поста тоже зависит от метки автора
+        self.client.get(self.urls['post'])
+        # повторно страницы отдаются из кэша уже с новым постом
+        self.assertEqual(self.cached(), set(self.urls))
+        self.assertContains(self.client.get(self.urls['index']), 'свежий пост')
+
+    def test_touch_after_commit(self):
+        """Тестирует повторное обновление меток после фиксации транзакции."""
+        with patch('posts.invalidation.transaction.on_commit') as on_commit:
+            invalidation.touch(invalidation.POSTS)
+        stamp = invalidation.stamps([invalidation.POSTS])
+        # страница, отрисованная до фиксации по старым данным, сбрасывается при фиксации
+        on_commit.call_args[0][0]()
+        self.assertGreater(invalidation.stamps([invalidation.POSTS]), stamp)
+
+    def test_authenticated(self):
+        """Тестирует, что авторизованным пользователям страницы из кэша не отдаются."""
+        self.client.force_login(self.author)
+        response = self.client.get(self.urls['post'])
+        self.assertContains(response, 'Добавить комментарий')
+        self.client.logout()
+        self.assertNotContains(self.client.get(self.urls['post']), 'Добавить комментарий')
+
+
+class TestFeeds(TestCase):
+    """Набор тестов для проверки лент Atom, RSS и JSON Feed."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('feeder', first_name='Лев', last_name='Толстой')
+        self.group = Group.objects.create(title='Ленты', slug='feeds', description='Подписки')
+        self.post = Post.objects.create(author=self.author, group=self.group, text='первая запись')
+        Post.objects.create(author=User.objects.create_user('other'), text='чужая запись')
+        self.urls = {
+            'index': reverse('feed'),
+            'group': reverse('group_feed', args=[self.group.slug]),
+            'author': reverse('profile_feed', args=[self.author.username]),
+        }
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_formats(self):
+        """Тестирует содержимое лент во всех форматах."""
+        atom = self.content(self.client.get(self.urls['group']))
+        self.assertIn('xmlns="http://www.w3.org/2005/Atom"', atom)
+        self.assertIn('первая запись', atom)
+        self.assertNotIn('чужая запись', atom)
+        self.assertIn('Лев Толстой', atom)
+
+        rss = self.content(self.client.get(self.urls['index'], {'format': 'rss'}))
+        self.assertIn('<rss', rss)
+        self.assertEqual(rss.count('<item>'), 2)
+
+        data = json.loads(self.content(self.client.get(self.urls['author'], {'format': 'json'})))
+        self.assertEqual([item['title'] for item in data['items']], ['первая запись'])
+        self.assertEqual(data['items'][0]['tags'], ['Ленты'])
+
+        self.assertEqual(self.client.get(self.urls['index'], {'format': 'yaml'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('profile_feed', args=['nobody'])).status_code, 404)
+
+    def test_cache(self):
+        """Тестирует отдачу ленты из кэша до изменения постов ее области и ответ 304."""
+        # авторизованным пользователям страницы из кэша страниц не отдаются, поэтому проверяется кэш лент;
+        # остаются только запросы сессии и пользователя
+        self.client.force_login(self.author)
+        first = self.content(self.client.get(self.urls['author']))
+        with self.assertNumQueries(2):
+            response = self.client.get(self.urls['author'])
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content.decode(), first)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.urls['author'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        Post.objects.create(author=self.author, text='вторая запись')
+        self.assertIn('вторая запись', self.content(self.client.get(self.urls['author'])))
+
+    def test_hosts(self):
+        """Тестирует, что лента из кэша не отдается с абсолютными ссылками другого адреса сайта."""
+        for host, scheme in (('testserver', 'http'), ('localhost', 'http'), ('localhost', 'https')):
+            for _ in range(2):
+                response = self.client.get(self.urls['index'], HTTP_HOST=host, secure=scheme == 'https')
+                content = self.content(response) if response.streaming else response.content.decode()
+                self.assertIn(f'{scheme}://{host}/feed/', content)
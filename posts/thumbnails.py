@@ -0,0 +1,180 @@
+"""
+Предварительное создание миниатюр изображений.
+
+Миниатюры всех стандартных размеров создаются фоновой задачей (см. tasks.queue) сразу после
+загрузки изображения, а шаблоны только ищут уже готовые миниатюры в хранилище sorl.thumbnail.
+Пока миниатюра не готова, шаблон показывает заглушку.
+
+Кроме миниатюр в исходном формате создаются варианты в формате WebP с обычной и двойной
+плотностью пикселей; они отдаются браузеру через <picture> и srcset.
+"""
+from django.apps import apps
+from django.db.models import F
+from django.utils.html import format_html
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import settings as thumbnail_settings, defaults as thumbnail_defaults
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.templatetags.thumbnail import margin
+
+from tasks import queue
+from yatube.profiling import timed
+from . import invalidation
+
+# стандартные размеры миниатюр для каждого поля с изображением
+VARIANTS = {
+    'posts.post.image': ('320x200', '400', '500'),
+    'posts.group.image': ('64x64',),
+    'users.userprofile.foto': ('64x64', '200x200'),
+}
+
+# множители плотности пикселей для вариантов в формате WebP
+DENSITIES = (1, 2)
+WEBP_FORMAT = 'WEBP'
+
+
+def field_label(field_file):
+    return f'{field_file.instance._meta.label_lower}.{field_file.field.name}'
+
+
+def scale_geometry(geometry, factor):
+    """Увеличивает размеры в строке вида "320x200" или "400" в factor раз."""
+    return 'x'.join(str(int(size) * factor) if size else '' for size in geometry.split('x'))
+
+
+def webp_variants(geometry):
+    """Возвращает список вариантов миниатюры в формате WebP: (размеры, параметры, плотность)."""
+    return [
+        # увеличивать маленькие изображения для экранов с высокой плотностью пикселей бессмысленно
+        (scale_geometry(geometry, density), {'format': WEBP_FORMAT, 'upscale': density == 1}, density)
+        for density in DENSITIES
+    ]
+
+
+def all_variants(label):
+    """Возвращает все миниатюры, создаваемые для поля: пары (размеры, параметры)."""
+    variants = []
+    for geometry in VARIANTS[label]:
+        variants.append((geometry, {}))
+        variants.extend((webp_geometry, options) for webp_geometry, options, density in webp_variants(geometry))
+    return variants
+
+
+def thumbnail_file(field_file, geometry, **options):
+    """
+    Возвращает файл миниатюры изображения, который мог быть еще не создан.
+    Параметры миниатюры дополняются значениями по умолчанию так же, как это делает sorl.thumbnail.
+    """
+    backend = default.backend
+    source = ImageFile(field_file)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(thumbnail_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(backend._get_thumbnail_filename(source, geometry, options), default.storage)
+
+
+def lookup(field_file, geometry, **options):
+    """Возвращает готовую миниатюру изображения или None, не создавая ее."""
+    return default.kvstore.get(thumbnail_file(field_file, geometry, **options))
+
+
+@timed('thumbnails')
+def prefetch(field_files):
+    """
+    Загружает метаданные всех стандартных миниатюр изображений одним запросом к хранилищу,
+    чтобы последующие вызовы lookup для них не обращались к нему по отдельности.
+    """
+    if not hasattr(default.kvstore, 'prefetch'):
+        return
+    keys = [
+        thumbnail_file(field_file, geometry, **options).key
+        for field_file in field_files if field_file and field_label(field_file) in VARIANTS
+        for geometry, options in all_variants(field_label(field_file))
+    ]
+    if keys:
+        default.kvstore.prefetch(keys)
+
+
+def generate(label, pk, name):
+    """Создает все стандартные миниатюры изображения. Выполняется фоновой задачей."""
+    for geometry, options in all_variants(label):
+        get_thumbnail(name, geometry, **options)
+    # страницы и карточки постов могли попасть в кэш с заглушками вместо миниатюр
+    if label == 'posts.post.image':
+        posts = apps.get_model('posts', 'Post').objects.filter(pk=pk)
+        posts.update(version=F('version') + 1)
+        for post in posts.select_related('author'):
+            invalidation.touch_post(post)
+    elif label == 'posts.group.image':
+        invalidation.touch(invalidation.GROUPS, invalidation.group_tag(pk))
+    else:
+        profiles = apps.get_model('users', 'UserProfile').objects.filter(pk=pk)
+        for username in profiles.values_list('user__username', flat=True):
+            invalidation.touch(invalidation.author_tag(username))
+
+
+def schedule(field_file):
+    """
+    Ставит в очередь создание миниатюр изображения.
+    Изображения, миниатюры которых уже созданы, в очередь не ставятся, а уже стоящие в очереди
+    не ставятся повторно.
+    """
+    if not field_file:
+        return
+    label = field_label(field_file)
+    if label not in VARIANTS:
+        return
+    if all(lookup(field_file, geometry, **options) for geometry, options in all_variants(label)):
+        return
+    queue.enqueue('posts.generate_thumbnails', label, field_file.instance.pk, field_file.name)
+
+
+def get_or_schedule(field_file, geometry):
+    """Возвращает готовую миниатюру, а если ее еще нет - ставит изображение в очередь и возвращает None."""
+    if not field_file:
+        return None
+    thumbnail = lookup(field_file, geometry)
+    if thumbnail is None:
+        schedule(field_file)
+    return thumbnail
+
+
+@timed('thumbnails')
+def picture(field_file, geometry, css_class='', with_margin=False):
+    """
+    Возвращает HTML-элемент <picture> с вариантами миниатюры в формате WebP и запасной
+    миниатюрой в исходном формате или пустую строку, если миниатюры еще не готовы.
+    """
+    fallback = get_or_schedule(field_file, geometry)
+    if fallback is None:
+        return ''
+
+    srcset = []
+    for webp_geometry, options, density in webp_variants(geometry):
+        thumbnail = lookup(field_file, webp_geometry, **options)
+        if thumbnail is not None:
+            srcset.append(f'{thumbnail.url} {density}x')
+    style = format_html(' style="margin:{}"', margin(fallback, geometry)) if with_margin else ''
+    source = format_html('<source type="image/webp" srcset="{}">', ', '.join(srcset)) if srcset else ''
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" width="{}" height="{}"{}></picture>',
+        source, css_class, fallback.url, fallback.width, fallback.height, style
+    )
+
+
+@timed('thumbnails')
+def webp_preview(field_file, geometry):
+    """Возвращает адрес и srcset миниатюры в формате WebP для предпросмотра в форме или None."""
+    variants = [
+        (lookup(field_file, webp_geometry, **options), density)
+        for webp_geometry, options, density in webp_variants(geometry)
+    ]
+    if variants[0][0] is None:
+        schedule(field_file)
+        return None
+    srcset = ', '.join(f'{thumbnail.url} {density}x' for thumbnail, density in variants if thumbnail is not None)
+    return variants[0][0].url, srcset
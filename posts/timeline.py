@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.db.models import Max
+
+from users.models import UserProfile
+from .models import Post, Follow, TimelineEntry
+from .pagination import CursorPaginator
+
+
+def is_fanout_author(author_id):
+    """Проверяет, раскладываются ли посты автора по лентам подписчиков при публикации."""
+    followers_count = (
+        UserProfile.objects.filter(user_id=author_id)
+        .values_list('followers_count', flat=True)
+        .first()
+    )
+    return (followers_count or 0) <= settings.FOLLOW_FEED_FANOUT_LIMIT
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if not is_fanout_author(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date) for user_id in followers.iterator()),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя последние посты автора, на которого он подписался."""
+    if not is_fanout_author(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values_list('pk', 'pub_date')[:settings.FOLLOW_FEED_BACKFILL]
+    )
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date) for post_id, pub_date in posts),
+        ignore_conflicts=True,
+    )
+
+
+def restore_fan_out(author_id):
+    """
+    Раскладывает по лентам подписчиков посты автора, у которого подписчиков снова не больше
+    FOLLOW_FEED_FANOUT_LIMIT: посты, опубликованные, пока они подмешивались при чтении, в ленты
+    не попали, а подписчики, подписавшиеся за это время, не получили последних постов автора.
+    """
+    if not is_fanout_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id)
+    missing = set(posts.order_by('-pub_date').values_list('pk', 'pub_date')[:settings.FOLLOW_FEED_BACKFILL])
+    # последний пост, разложенный по лентам до того, как подписчиков стало больше порога
+    since = TimelineEntry.objects.filter(post__author_id=author_id).aggregate(since=Max('pub_date'))['since']
+    if since is not None:
+        missing.update(posts.filter(pub_date__gt=since).values_list('pk', 'pub_date'))
+    followers = Follow.objects.filter(author_id=author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id in followers.iterator() for post_id, pub_date in missing
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    """Удаляет из ленты пользователя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(user_id=user_id, post__author_id=author_id).delete()
+
+
+def pull_authors(user):
+    """Возвращает id авторов из подписок пользователя, посты которых не раскладываются по лентам."""
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__profile__followers_count__gt=settings.FOLLOW_FEED_FANOUT_LIMIT
+        ).values_list('author_id', flat=True)
+    )
+
+
+def follow_feed(user):
+    """
+    Возвращает queryset постов ленты подписок пользователя для постраничного вывода по номерам страниц.
+    Посты берутся из материализованной ленты, а посты популярных авторов, которые
+    при публикации не раскладываются по лентам, подмешиваются при чтении.
+    """
+    feed = Post.objects.filter(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+    authors = pull_authors(user)
+    if authors:
+        feed = feed | Post.objects.filter(author_id__in=authors)
+    return feed
+
+
+class TimelineEntryPaginator(CursorPaginator):
+    id_field = 'post_id'
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Пагинатор ленты подписок.
+
+    Страница выбирается из материализованной ленты по индексу (user, -pub_date, -post_id),
+    и только затем загружаются ее посты. Посты популярных авторов выбираются по индексу
+    (author, -pub_date, -id) с тем же ключом и объединяются с записями ленты.
+    """
+
+    def __init__(self, user, queryset, per_page):
+        super().__init__(queryset, per_page)
+        self.user = user
+        self.pull_authors = pull_authors(user)
+
+    def fetch(self, key=None, forward=True, limit=None):
+        entries = TimelineEntryPaginator(TimelineEntry.objects.filter(user=self.user).only('post_id'), limit)
+        post_ids = [entry.post_id for entry in entries.fetch(key, forward, limit)]
+        posts = {post.pk: post for post in self.queryset.filter(pk__in=post_ids)}
+        if self.pull_authors:
+            pulled = CursorPaginator(self.queryset.filter(author_id__in=self.pull_authors), limit)
+            posts.update((post.pk, post) for post in pulled.fetch(key, forward, limit))
+        items = sorted(posts.values(), key=lambda post: (post.pub_date, post.pk), reverse=self.descending == forward)
+        return items[:limit]
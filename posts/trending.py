@@ -0,0 +1,61 @@
+"""
+Популярные посты.
+
+Популярность поста - это его вовлеченность (оценки и комментарии), затухающая со временем
+по степенному закону. Она не вычисляется при запросе страницы: команда update_trending,
+запускаемая периодически, пересчитывает ее в индексированное поле Post.trending_score
+только для постов за последние TRENDING_WINDOW_DAYS дней, а у более старых постов обнуляет.
+Страница популярных постов выводится по курсору (trending_score, id), без COUNT(*) и OFFSET.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import invalidation
+from .models import Post
+from .pagination import CursorPaginator
+
+BATCH_SIZE = 500
+
+
+def score(pub_date, comment_count, likes_count, dislikes_count, now):
+    """Возвращает популярность поста на момент now."""
+    engagement = 1 + likes_count - dislikes_count + settings.TRENDING_COMMENT_WEIGHT * comment_count
+    age_hours = max((now - pub_date).total_seconds(), 0) / 3600
+    return engagement / (age_hours + 2) ** settings.TRENDING_GRAVITY
+
+
+def update_scores(now=None):
+    """Пересчитывает популярность постов. Возвращает количество пересчитанных постов."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    Post.objects.filter(pub_date__lt=cutoff).exclude(trending_score=0).update(trending_score=0)
+
+    posts = (
+        Post.objects.filter(pub_date__gte=cutoff)
+        .only('pub_date', 'comment_count', 'likes_count', 'dislikes_count', 'trending_score')
+    )
+    batch, updated = [], 0
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        post.trending_score = score(post.pub_date, post.comment_count, post.likes_count, post.dislikes_count, now)
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['trending_score'])
+            updated, batch = updated + len(batch), []
+    Post.objects.bulk_update(batch, ['trending_score'])
+    invalidation.touch(invalidation.TRENDING)
+    return updated + len(batch)
+
+
+def top_posts():
+    """Возвращает queryset популярных постов в порядке убывания популярности."""
+    return Post.objects.filter(trending_score__gt=0).order_by('-trending_score', '-id')
+
+
+class TrendingPaginator(CursorPaginator):
+    """Пагинатор популярных постов по ключу (trending_score, id), от популярных к менее популярным."""
+    date_field = 'trending_score'
+    # repr числа с плавающей точкой однозначно восстанавливается float
+    dump_key = staticmethod(repr)
+    load_key = staticmethod(float)
@@ -1,17 +1,26 @@
 from django.urls import path
-from . import views
+from . import feeds, views
+from .models import Reaction
 
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
+    path('feed/', feeds.IndexFeed.as_view(), name='feed'),
     path('follow/', views.FollowView.as_view(), name='follow_index'),
+    path('top/', views.TopView.as_view(), name='top'),
     path('new/', views.PostCreate.as_view(), name='new_post'),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('group/<slug:slug>/', views.GroupView.as_view(), name='group-posts'),
+    path('group/<slug:slug>/feed/', feeds.GroupFeed.as_view(), name='group_feed'),
     path('user/<username>/', views.ProfileView.as_view(), name='profile'),
+    path('user/<username>/feed/', feeds.AuthorFeed.as_view(), name='profile_feed'),
     path('<username>/follow/', views.profile_follow, name='profile_follow'),
     path('<username>/unfollow/', views.profile_unfollow, name='profile_unfollow'),
     path('<username>/<int:post_id>/', views.PostView.as_view(), name='post'),
     path('<username>/<int:post_id>/edit/', views.PostUpdate.as_view(), name='post_edit'),
     path('<username>/<int:post_id>/delete/', views.PostDelete.as_view(), name='post_delete'),
     path('<username>/<int:post_id>/comment/', views.CommentCreate.as_view(), name='add_comment'),
+    path('<username>/<int:post_id>/comments/', views.CommentListView.as_view(), name='post_comments'),
+    path('<username>/<int:post_id>/like/', views.post_react, {'value': Reaction.LIKE}, name='post_like'),
+    path('<username>/<int:post_id>/dislike/', views.post_react, {'value': Reaction.DISLIKE}, name='post_dislike'),
     path('groups/', views.GroupListView.as_view(), name='groups')
 ]
\ No newline at end of file
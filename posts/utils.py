@@ -1,31 +1,144 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Count
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
 
-from .models import Follow
+from yatube.cache import get_or_compute
+from . import thumbnails
+from .models import Group, Follow, Post, Comment
+from .pagination import CommentPaginator
 
 
 User = get_user_model()
 
 
-def get_user_profile(username):
+def memoize(request, func, *args):
     """
-    Возвращает объект пользователя с дополнительными полями:
+    Вызывает func(*args) не больше одного раза за время обработки запроса и возвращает
+    запомненный в объекте запроса результат. Аргументы должны быть хешируемыми.
+    """
+    memo = request.__dict__.setdefault('_memo', {})
+    key = (func, args)
+    if key not in memo:
+        memo[key] = func(*args)
+    return memo[key]
+
+
+def is_followed_annotation(viewer, author_ref):
+    """Возвращает выражение для флага подписки пользователя viewer на автора, на которого ссылается author_ref."""
+    return Exists(Follow.objects.filter(user=viewer, author=OuterRef(author_ref)))
+
+
+def set_profile_counts(user):
+    """
+    Добавляет к объекту пользователя поля:
         count_of_posts: integer, количество постов пользователя
         count_of_following: integer, количество подписчиков пользователя
         count_of_followers: integer, количество подписок пользователя
+    Значения берутся из счетчиков профиля, которые поддерживаются в posts.signals.
+    """
+    profile = getattr(user, 'profile', None)
+    user.count_of_posts = profile.posts_count if profile else 0
+    user.count_of_following = profile.followers_count if profile else 0
+    user.count_of_follower = profile.following_count if profile else 0
+    return user
+
+
+def get_user_profile(username, viewer=None):
+    """
+    Возвращает объект пользователя с полями из set_profile_counts.
+    Если передан авторизованный viewer, тем же запросом определяется, подписан ли он на пользователя.
+    """
+    users = User.objects.select_related('profile')
+    if viewer is not None and viewer.is_authenticated:
+        users = users.annotate(is_followed=is_followed_annotation(viewer, 'pk'))
+    return set_profile_counts(get_object_or_404(users, username=username))
+
+
+def get_author_post(username, post_id, viewer=None):
+    """
+    Возвращает пост автора одним запросом вместе с автором, его профилем и сообществом.
+    Если пост принадлежит другому автору, вызывает Http404. Если передан авторизованный viewer,
+    тем же запросом определяется, подписан ли он на автора.
     """
-    return get_object_or_404(
-        User.objects.annotate(
-            count_of_posts=Count('posts', distinct=True),
-            count_of_following=Count('following', distinct=True),
-            count_of_follower=Count('follower', distinct=True)
-        ),
-        username=username)
+    posts = Post.objects.select_related('author', 'author__profile', 'group')
+    if viewer is not None and viewer.is_authenticated:
+        posts = posts.annotate(is_followed=is_followed_annotation(viewer, 'author_id'))
+    post = get_object_or_404(posts, pk=post_id, author__username=username)
+    if hasattr(post, 'is_followed'):
+        post.author.is_followed = post.is_followed
+    set_profile_counts(post.author)
+    return post
+
+
+def get_comments_page(post_id, cursor=None):
+    """Возвращает страницу комментариев поста по курсору вместе с авторами и их профилями."""
+    comments = Comment.objects.filter(post_id=post_id).select_related('author', 'author__profile')
+    return CommentPaginator(comments, settings.COMMENTS_PER_PAGE).page(cursor)
+
+
+def group_cache_key(slug):
+    return f'group:{slug}'
+
+
+def get_group(slug):
+    """Возвращает сообщество по адресу, кэшируя его для шапки страницы сообщества."""
+    group = get_or_compute(
+        group_cache_key(slug),
+        lambda: Group.objects.filter(slug=slug).first(),
+        settings.GROUP_CACHE_TIMEOUT
+    )
+    if group is None:
+        raise Http404('Сообщество не найдено')
+    return group
+
+
+def get_foto(user):
+    """Возвращает аватар пользователя или None, если у пользователя нет профиля."""
+    profile = getattr(user, 'profile', None)
+    return profile.foto if profile else None
 
 
 def check_following(user, author):
     """Функция проверяет, подписан ли пользователь на автора."""
+    if hasattr(author, 'is_followed'):
+        # флаг уже получен вместе с автором в get_user_profile или get_author_post
+        return author.is_followed
     if user.is_authenticated:
         return Follow.objects.filter(user=user, author=author).exists()
-    return False
\ No newline at end of file
+    return False
+
+
+def post_card_cache_key(post, comment_button_able=True):
+    """
+    Возвращает ключ кэша для отрисованной карточки поста.
+    В ключ входит дата публикации, чтобы после удаления поста его идентификатор,
+    повторно выданный базой данных, не подхватил чужую карточку.
+    """
+    return f'post_card:{post.pk}:{post.pub_date.timestamp()}:{post.version}:{int(comment_button_able)}'
+
+
+def post_card_cache_keys(post):
+    """Возвращает ключи кэша для всех вариантов карточки поста."""
+    return [post_card_cache_key(post, comment_button_able) for comment_button_able in (True, False)]
+
+
+def render_post_cards(posts, comment_button_able=True):
+    """
+    Возвращает HTML карточек постов.
+    Карточки читаются из кэша одним запросом, отсутствующие отрисовываются и сохраняются в кэш.
+    """
+    keys = {post_card_cache_key(post, comment_button_able): post for post in posts}
+    cards = cache.get_many(keys)
+    thumbnails.prefetch(post.image for key, post in keys.items() if key not in cards)
+    missing = {
+        key: render_to_string('post_item.html', {'post': post, 'comment_button_able': comment_button_able})
+        for key, post in keys.items() if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return ''.join(cards[key] for key in keys)
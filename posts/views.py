@@ -1,71 +1,176 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, UpdateView, DeleteView
-from django.views.generic.base import TemplateView
+from django.views.generic.base import TemplateView, View
 from django.views.generic.list import ListView
 
+from yatube import concurrency
+from . import invalidation, reactions, search, thumbnails, trending
 from .forms import PostForm, CommentForm
 from .models import Post, Group, Follow
-from .utils import get_user_profile, check_following
+from .pagination import CursorPaginationMixin
+from .timeline import follow_feed, TimelinePaginator
+from .utils import (
+    memoize, get_user_profile, get_author_post, get_comments_page, get_group, get_foto, check_following
+)
 
 User = get_user_model()
 
 
-class IndexView(ListView):
+class ConditionalMixin:
+    """
+    Примесь, отвечающая на GET-запросы 304 Not Modified, если страница не изменилась.
+
+    ETag и Last-Modified вычисляются по меткам изменения из get_invalidation_tags() одним
+    запросом к кэшу, до выполнения основного запроса к базе данных и отрисовки шаблона.
+    """
+
+    def get_invalidation_tags(self):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        tags = self.get_invalidation_tags()
+        etag, last_modified, stamps = invalidation.validators(request, tags)
+        last_modified = int(last_modified)
+        # по меткам и их временам на момент отрисовки страница проверяется в кэше страниц
+        request.invalidation_tags, request.invalidation_stamps = tags, stamps[:len(tags)]
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            return response
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        if request.user.is_authenticated:
+            # страница содержит данные пользователя: хранить ее может только браузер, сверяясь с сервером
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.ANONYMOUS_CACHE_MAX_AGE)
+        return response
+
+
+class UserReactionsMixin:
+    """Примесь для ListView, добавляющая в контекст оценки текущего пользователя для постов страницы."""
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['user_reactions'] = reactions.user_reactions(self.request.user, context['object_list'])
+        return context
+
+
+class IndexView(ConditionalMixin, UserReactionsMixin, CursorPaginationMixin, ListView):
     """Главная страница сайта."""
     paginate_by = 10
+    first_page_cache_key = 'index_first_page'
     template_name = 'index.html'
 
+    def get_invalidation_tags(self):
+        return [invalidation.POSTS]
+
     def get_queryset(self):
         return (
             Post.objects.select_related('author', 'group')
-            .annotate(comment_count=Count('comments'))
             .all()
         )
 
 
-class FollowView(LoginRequiredMixin, ListView):
+class TopView(ConditionalMixin, UserReactionsMixin, CursorPaginationMixin, ListView):
+    """Страница популярных постов."""
+    paginate_by = 10
+    template_name = 'top.html'
+
+    def get_invalidation_tags(self):
+        return [invalidation.POSTS, invalidation.TRENDING]
+
+    def get_queryset(self):
+        return trending.top_posts().select_related('author', 'group')
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return trending.TrendingPaginator(queryset, page_size)
+
+
+class FollowView(LoginRequiredMixin, ConditionalMixin, UserReactionsMixin, CursorPaginationMixin, ListView):
     """Страница постов авторов, на которых подписан пользователь."""
     paginate_by = 10
     template_name = 'follow.html'
 
+    def get_invalidation_tags(self):
+        return [invalidation.POSTS]
+
     def get_queryset(self):
-        return (
-            Post.objects.select_related('author', 'group')
-            .annotate(comment_count=Count('comments'))
-            .filter(author__following__user=self.request.user)
-        )
+        if self.page_kwarg in self.request.GET:
+            return follow_feed(self.request.user).select_related('author', 'group')
+        return Post.objects.select_related('author', 'group')
 
+    def get_cursor_paginator(self, queryset, page_size):
+        return TimelinePaginator(self.request.user, queryset, page_size)
 
-class GroupView(ListView):
+
+class GroupView(ConditionalMixin, UserReactionsMixin, CursorPaginationMixin, ListView):
     """Страница сообщества с постами."""
     template_name = 'group.html'
     paginate_by = 10
 
+    def get_invalidation_tags(self):
+        group = memoize(self.request, get_group, self.kwargs['slug'])
+        return [invalidation.group_tag(group.pk)]
+
     def get_queryset(self):
-        group = get_object_or_404(Group, slug=self.kwargs['slug'])
+        group = memoize(self.request, get_group, self.kwargs['slug'])
         return (
             group.posts.select_related('author', 'group')
-            .annotate(comment_count=Count('comments'))
             .all()
         )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['group'] = get_object_or_404(Group, slug=self.kwargs['slug'])
+        context['group'] = memoize(self.request, get_group, self.kwargs['slug'])
         return context
 
 
-class GroupListView(ListView):
+class GroupListView(ConditionalMixin, ListView):
     """Страница со списком сообществ."""
     model = Group
     template_name = 'group_list.html'
     paginate_by = 30
 
+    def get_invalidation_tags(self):
+        return [invalidation.GROUPS]
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        thumbnails.prefetch(group.image for group in context['page_obj'])
+        return context
+
+
+class SearchView(TemplateView):
+    """Страница поиска по постам, комментариям и сообществам."""
+    template_name = 'search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        posts, groups = search.search(query) if query else ([], [])
+
+        context['query'] = query
+        context['results'] = [(post, search.highlight(post.text, query)) for post in posts]
+        context['groups'] = groups
+        return context
+
 
 class PostCreate(LoginRequiredMixin, CreateView):
     """Страница создания нового поста."""
@@ -73,7 +178,10 @@ class PostCreate(LoginRequiredMixin, CreateView):
     template_name = 'post_edit.html'
     success_url = reverse_lazy('index')
 
+    @transaction.atomic
     def form_valid(self, form):
+        # post_save посылается после выхода save() из транзакции: счетчики и версии, которые
+        # обновляют сигналы, фиксируются вместе с самой записью только внутри общей транзакции
         form.instance.author = self.request.user
         return super().form_valid(form)
 
@@ -85,6 +193,10 @@ class PostUpdate(LoginRequiredMixin, UpdateView):
     form_class = PostForm
     template_name = 'post_edit.html'
 
+    @transaction.atomic
+    def form_valid(self, form):
+        return super().form_valid(form)
+
     def get(self, request, *args, **kwargs):
         post = self.get_object()
         if post.author != request.user:
@@ -112,52 +224,99 @@ class PostDelete(LoginRequiredMixin, DeleteView):
         return reverse_lazy('profile', args=[self.kwargs['username']])
 
 
-class ProfileView(ListView):
+class ProfileView(ConditionalMixin, UserReactionsMixin, CursorPaginationMixin, ListView):
     """Страница профиля пользователя."""
     template_name = 'profile.html'
     paginate_by = 5
 
+    def get_invalidation_tags(self):
+        return [invalidation.author_tag(self.kwargs['username'])]
+
+    def get(self, request, *args, **kwargs):
+        # профиль автора не нужен для выборки постов и загружается параллельно с ней
+        self.author = concurrency.start(get_user_profile, self.kwargs['username'], request.user)
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
-        author = get_user_profile(self.kwargs['username'])
-        self.kwargs['author'] = author
         return (
-            author.posts.select_related('author', 'group')
-            .annotate(comment_count=Count('comments'))
-            .all()
+            Post.objects.filter(author__username=self.kwargs['username'])
+            .select_related('author', 'group')
         )
 
+    def get_author(self):
+        return self.author.result()
+
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
-        context['author'] = self.kwargs['author']
+        context['author'] = self.get_author()
         context['following'] = check_following(self.request.user, context['author'])
+        thumbnails.prefetch([get_foto(context['author'])])
         return context
 
 
-class PostView(TemplateView):
+class PostView(ConditionalMixin, TemplateView):
     """Страница просмотра поста."""
     template_name = 'post.html'
 
+    def get_invalidation_tags(self):
+        return [invalidation.post_tag(self.kwargs['post_id']), invalidation.author_tag(self.kwargs['username'])]
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        author = get_user_profile(self.kwargs['username'])
-        post = get_object_or_404(Post.objects.annotate(comment_count=Count('comments')), pk=self.kwargs['post_id'])
-        comments = post.comments.select_related('author', 'author__profile').order_by('created').all()
+        # первая страница комментариев загружается параллельно с постом, автором и его профилем
+        comments = concurrency.start(get_comments_page, self.kwargs['post_id'])
+        post = get_author_post(self.kwargs['username'], self.kwargs['post_id'], self.request.user)
+        author = post.author
+        comments = comments.result()
         new_comment_form = CommentForm()
+        thumbnails.prefetch([post.image, get_foto(author)] + [get_foto(comment.author) for comment in comments])
 
         context['author'] = author
-        context['following'] = context['following'] = check_following(self.request.user, context['author'])
+        context['following'] = check_following(self.request.user, author)
         context['post'] = post
         context['comments'] = comments
+        context['next_url'] = comments_next_url(author.username, post.pk, comments)
         context['new_comment_form'] = new_comment_form
+        context['user_reactions'] = reactions.user_reactions(self.request.user, [post])
 
         return context
 
 
+def comments_next_url(username, post_id, page):
+    """Возвращает адрес следующей страницы комментариев или None, если это последняя страница."""
+    if not page.has_next():
+        return None
+    return f'{reverse("post_comments", args=[username, post_id])}?{urlencode({"cursor": page.next_cursor})}'
+
+
+class CommentListView(ConditionalMixin, View):
+    """
+    Следующие страницы комментариев поста для бесконечной прокрутки.
+    Отдает HTML-фрагмент со ссылкой на следующую страницу, а с параметром format=json -
+    JSON с HTML комментариев и адресом следующей страницы.
+    """
+
+    def get_invalidation_tags(self):
+        return [invalidation.post_tag(self.kwargs['post_id']), invalidation.author_tag(self.kwargs['username'])]
+
+    def get(self, request, username, post_id):
+        get_object_or_404(Post.objects.only('pk'), pk=post_id, author__username=username)
+        comments = get_comments_page(post_id, request.GET.get('cursor'))
+        thumbnails.prefetch(get_foto(comment.author) for comment in comments)
+        next_url = comments_next_url(username, post_id, comments)
+
+        if request.GET.get('format') == 'json':
+            html = render_to_string('comment_items.html', {'comments': comments})
+            return JsonResponse({'html': html, 'next': next_url})
+        return HttpResponse(render_to_string('comment_page.html', {'comments': comments, 'next_url': next_url}))
+
+
 class CommentCreate(LoginRequiredMixin, CreateView):
     """Контроллер для создания комментария. """
     http_method_names = ['post']
     form_class = CommentForm
 
+    @transaction.atomic
     def form_valid(self, form):
         form.instance.author = self.request.user
         form.instance.post = Post.objects.get(pk=self.kwargs['post_id'])
@@ -178,7 +337,8 @@ def profile_follow(request, username):
         # подписаться несколько раз на одного пользователя нельзя
         return redirect('profile', username=username)
 
-    follow = Follow.objects.create(user=request.user, author=author)
+    with transaction.atomic():
+        follow = Follow.objects.create(user=request.user, author=author)
     return redirect('profile', username=username)
 
 
@@ -191,6 +351,24 @@ def profile_unfollow(request, username):
     return redirect('profile', username=username)
 
 
+@login_required
+@require_POST
+def post_react(request, username, post_id, value):
+    """Контроллер для оценки поста: повторная такая же оценка отменяет прежнюю."""
+    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    value = reactions.react(request.user, post, value)
+    if not request.is_ajax():
+        return redirect('post', username=username, post_id=post_id)
+
+    post.refresh_from_db(fields=['likes_count', 'dislikes_count'])
+    return JsonResponse({
+        'value': value,
+        'likes': post.likes_count,
+        'dislikes': post.dislikes_count,
+        'score': post.score,
+    })
+
+
 def page_not_found(request, exception):
     """Страница ошибки при обращении к несуществующему адресу."""
     return render(request, "misc/404.html", {"path": request.path}, status=404)
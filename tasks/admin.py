@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'args', 'run_after', 'attempts', 'failed')
+    search_fields = ('name',)
+    list_filter = ('failed', 'name')
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from tasks import queue
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int,
+            help='Сколько процессов выполняют задачи; по умолчанию TASK_WORKERS, 0 - выполнять в этом процессе'
+        )
+        parser.add_argument('--once', action='store_true', help='Завершиться, когда в очереди не останется задач')
+
+    def handle(self, *args, **options):
+        queue.check_shared_cache()
+        processed = queue.work(options['processes'], once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Обработано задач: {processed}'))
@@ -0,0 +1,27 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    name = models.CharField(max_length=100, verbose_name='Задача')
+    # аргументы обработчика в JSON
+    args = models.TextField(verbose_name='Аргументы')
+    # ключ уникальной задачи: пока она ждет выполнения, такая же задача повторно в очередь не ставится
+    dedup_key = models.CharField(max_length=255, unique=True, blank=True, null=True, verbose_name='Ключ')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Выполнить после')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    locked_by = models.CharField(max_length=32, blank=True, verbose_name='Обработчик')
+    locked_until = models.DateTimeField(blank=True, null=True, verbose_name='Занята до')
+    failed = models.BooleanField(default=False, verbose_name='Не выполнена')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['failed', 'run_after']),
+            models.Index(fields=['locked_by']),
+        ]
+
+    def __str__(self):
+        return f'{self.name}{self.args}'
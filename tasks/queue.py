@@ -0,0 +1,180 @@
+import datetime
+import json
+import logging
+import multiprocessing
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from yatube.cache import LRUMemoryCache
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+# кэши, значения которых видны только записавшему их процессу
+PROCESS_LOCAL_CACHES = (LRUMemoryCache, LocMemCache, DummyCache)
+
+
+def task(name, batch=False, unique=False):
+    """Регистрирует обработчик задачи name: пакетный с batch, без повторов в очереди с unique."""
+    def decorator(func):
+        func.task_name = name
+        func.batch = batch
+        func.unique = unique
+        REGISTRY[name] = func
+        return func
+    return decorator
+
+
+def call(name, calls):
+    """Вызывает обработчик задачи name для списка аргументов calls."""
+    handler = REGISTRY[name]
+    if handler.batch:
+        handler(calls)
+    else:
+        for args in calls:
+            handler(*args)
+
+
+def enqueue(name, *args, delay=0):
+    """Ставит в очередь задачу name с аргументами args, которые должны сериализоваться в JSON."""
+    handler = REGISTRY[name]
+    encoded = json.dumps(args)
+    if not settings.TASKS_ASYNC:
+        call(name, [json.loads(encoded)])
+        return
+    # задача попадает в очередь в той же транзакции, что и запись, которая ее поставила
+    Task.objects.bulk_create([
+        Task(
+            name=name,
+            args=encoded,
+            dedup_key=f'{name}:{encoded}' if handler.unique else None,
+            run_after=timezone.now() + datetime.timedelta(seconds=delay),
+        )
+    ], ignore_conflicts=True)
+
+
+def claim(limit):
+    """Забирает до limit задач, срок выполнения которых наступил и которые не заняты другим обработчиком."""
+    now = timezone.now()
+    available = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ids = list(
+        Task.objects.filter(available, failed=False, run_after__lte=now)
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # ключ уникальности снимается: изменения во время выполнения задачи ставят в очередь новую
+    Task.objects.filter(available, pk__in=ids).update(
+        locked_by=token,
+        locked_until=now + datetime.timedelta(seconds=settings.TASK_LOCK_TIMEOUT),
+        dedup_key=None,
+    )
+    return list(Task.objects.filter(locked_by=token))
+
+
+def split(tasks):
+    """Разбивает задачи на вызовы обработчиков: задачи пакетного обработчика объединяются по TASK_BATCH_SIZE."""
+    groups = defaultdict(list)
+    for item in tasks:
+        groups[item.name].append(item)
+    for name, group in groups.items():
+        handler = REGISTRY.get(name)
+        size = settings.TASK_BATCH_SIZE if handler is not None and handler.batch else 1
+        for start in range(0, len(group), size):
+            yield name, group[start:start + size]
+
+
+def execute(name, calls):
+    """Выполняет обработчик задачи и возвращает текст ошибки или None. Вызывается в процессе пула."""
+    close_old_connections()
+    try:
+        call(name, calls)
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', name)
+        return traceback.format_exc()
+    finally:
+        close_old_connections()
+    return None
+
+
+def finish(tasks, error):
+    """Удаляет выполненные задачи, а задачи с ошибкой откладывает для повторной попытки."""
+    if error is None:
+        Task.objects.filter(pk__in=[item.pk for item in tasks]).delete()
+        return
+    now = timezone.now()
+    for item in tasks:
+        item.attempts += 1
+        item.error = error
+        item.locked_by = ''
+        item.locked_until = None
+        if item.attempts >= settings.TASK_MAX_ATTEMPTS:
+            item.failed = True
+        else:
+            item.run_after = now + datetime.timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** (item.attempts - 1))
+        item.save(update_fields=['attempts', 'error', 'locked_by', 'locked_until', 'failed', 'run_after'])
+
+
+def process(tasks, executor=None):
+    """Выполняет забранные задачи в пуле процессов executor или, если его нет, в текущем процессе."""
+    jobs = [(name, group) for name, group in split(tasks)]
+    if executor is None:
+        results = [(group, execute(name, [json.loads(item.args) for item in group])) for name, group in jobs]
+    else:
+        futures = {
+            executor.submit(execute, name, [json.loads(item.args) for item in group]): group
+            for name, group in jobs
+        }
+        results = [(futures[future], future.result()) for future in as_completed(futures)]
+    for group, error in results:
+        finish(group, error)
+
+
+def check_shared_cache():
+    """Проверяет, что записанное задачами в кэш увидят веб-процессы."""
+    if settings.TASKS_ASYNC and isinstance(caches['default'], PROCESS_LOCAL_CACHES):
+        raise ImproperlyConfigured(
+            'Фоновым задачам нужен общий с веб-процессами кэш: задайте YATUBE_CACHE_URL '
+            'или выполняйте задачи сразу, TASKS_ASYNC = False'
+        )
+
+
+def work(processes=None, once=False):
+    """Выполняет задачи в пуле из processes процессов (при 0 - в текущем) и возвращает их количество."""
+    if processes is None:
+        processes = settings.TASK_WORKERS
+    executor = None
+    if processes > 0:
+        # процессы запускаются заново, а не копируются, чтобы не унаследовать соединения с базой данных
+        executor = ProcessPoolExecutor(processes, multiprocessing.get_context('spawn'), initializer=django.setup)
+
+    processed = 0
+    try:
+        while True:
+            tasks = claim(settings.TASK_BATCH_SIZE * max(processes, 1))
+            if tasks:
+                process(tasks, executor)
+                processed += len(tasks)
+                continue
+            if once:
+                return processed
+            time.sleep(settings.TASK_POLL_INTERVAL)
+    finally:
+        if executor is not None:
+            executor.shutdown()
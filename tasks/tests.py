@@ -0,0 +1,147 @@
+import datetime
+import tempfile
+from io import StringIO
+from unittest import skipIf
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, TimelineEntry
+from . import queue
+from .models import Task
+
+User = get_user_model()
+
+calls = []
+
+
+@queue.task('tests.collect', batch=True, unique=True)
+def collect(batch):
+    calls.append(sorted(value for value, in batch))
+
+
+@queue.task('tests.fail')
+def fail(value):
+    raise ValueError(value)
+
+
+@override_settings(TASKS_ASYNC=True, TASK_BATCH_SIZE=2, TASK_MAX_ATTEMPTS=2, TASK_RETRY_DELAY=10)
+class TestTaskQueue(TestCase):
+    """Набор тестов для проверки очереди фоновых задач."""
+
+    def setUp(self):
+        calls.clear()
+        self.author = User.objects.create_user('writer')
+        for number in range(3):
+            Follow.objects.create(user=User.objects.create_user(f'reader{number}'), author=self.author)
+
+    def test_deferred(self):
+        """Тестирует, что побочные действия записи выполняются обработчиком, а не в запросе."""
+        self.client.force_login(self.author)
+        self.client.post(reverse('new_post'), {'text': 'новый пост'})
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        self.assertTrue(Task.objects.filter(name='posts.fan_out_posts').exists())
+
+        # с кэшем в памяти процесса обработчик не увидел бы записанного веб-процессами и наоборот
+        with self.assertRaises(ImproperlyConfigured):
+            call_command('run_worker', processes=0, once=True, stdout=StringIO())
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+
+        output = StringIO()
+        with tempfile.TemporaryDirectory() as location:
+            shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with override_settings(CACHES={'default': shared}):
+                call_command('run_worker', processes=0, once=True, stdout=output)
+        self.assertIn('Обработано задач', output.getvalue())
+        self.assertEqual(TimelineEntry.objects.count(), 3)
+        self.assertFalse(Task.objects.exists())
+
+    def test_dedup_and_batches(self):
+        """Тестирует, что одинаковые задачи не дублируются, а пакетный обработчик получает их вместе."""
+        for value in (1, 2, 1, 3, 2):
+            queue.enqueue('tests.collect', value)
+        self.assertEqual(Task.objects.filter(name='tests.collect').count(), 3)
+
+        Task.objects.exclude(name='tests.collect').delete()
+        self.assertEqual(queue.work(0, once=True), 3)
+        self.assertEqual(sorted(calls), [[1, 2], [3]])
+
+    def test_dedup_while_running(self):
+        """Тестирует, что задача, поставленная во время выполнения такой же, не теряется."""
+        queue.enqueue('tests.collect', 1)
+        claimed = queue.claim(10)
+        queue.enqueue('tests.collect', 1)
+        self.assertEqual(Task.objects.filter(name='tests.collect').count(), 2)
+        queue.process(claimed)
+        self.assertEqual(Task.objects.filter(name='tests.collect').count(), 1)
+
+    def test_retries(self):
+        """Тестирует повторные попытки выполнить задачу с ошибкой."""
+        Task.objects.all().delete()
+        queue.enqueue('tests.fail', 'ошибка')
+        queue.work(0, once=True)
+        task = Task.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertFalse(task.failed)
+        self.assertIn('ValueError', task.error)
+        self.assertGreater(task.run_after, timezone.now())
+        # до срока повторной попытки задача не выполняется
+        self.assertEqual(queue.work(0, once=True), 0)
+
+        Task.objects.update(run_after=timezone.now() - datetime.timedelta(seconds=1))
+        queue.work(0, once=True)
+        task.refresh_from_db()
+        self.assertEqual(task.attempts, 2)
+        self.assertTrue(task.failed)
+        self.assertEqual(queue.work(0, once=True), 0)
+
+    def test_welcome_email(self):
+        """Тестирует, что приветственное письмо отправляется после регистрации, но не после правки профиля."""
+        self.client.post(reverse('signup'), {
+            'username': 'newcomer',
+            'email': 'newcomer@example.com',
+            'password1': 'A123456bc',
+            'password2': 'A123456bc',
+        })
+        self.assertEqual(len(mail.outbox), 0)
+        queue.work(0, once=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['newcomer@example.com'])
+
+        self.client.force_login(User.objects.get(username='newcomer'))
+        self.client.post(reverse('edit_profile', args=['newcomer']), {
+            'username': 'newcomer',
+            'email': 'newcomer@example.com',
+            'first_name': 'Новичок',
+        })
+        self.assertEqual(User.objects.get(username='newcomer').first_name, 'Новичок')
+        queue.work(0, once=True)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(TASKS_ASYNC=False)
+    def test_eager(self):
+        """Тестирует выполнение задач сразу при TASKS_ASYNC = False."""
+        queue.enqueue('tests.collect', 5)
+        self.assertEqual(calls, [[5]])
+        self.assertFalse(Task.objects.filter(name='tests.collect').exists())
+
+
+@skipIf(settings.CACHE_URL, 'задан общий кэш YATUBE_CACHE_URL')
+class TestDefaultSettings(TestCase):
+    """Набор тестов для проверки выполнения задач без общего кэша."""
+
+    def test_inline(self):
+        """Тестирует, что без общего кэша задачи выполняются сразу, а не ждут run_worker."""
+        author = User.objects.create_user('writer')
+        reader = User.objects.create_user('reader')
+        Follow.objects.create(user=reader, author=author)
+        self.client.force_login(author)
+        self.client.post(reverse('new_post'), {'text': 'новый пост'})
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(), 1)
@@ -22,3 +22,17 @@ class UserProfile(models.Model):
         validators=[validators.validate_no_future_date]
     )
     sex = models.CharField(blank=True, null=True, max_length=1, choices=SEX_CHOICES, verbose_name='Пол')
+    posts_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество записей')
+    followers_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков')
+    following_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписок')
+
+    # счетчики изменяются только атомарными UPDATE из posts.signals
+    counter_fields = ('posts_count', 'followers_count', 'following_count')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
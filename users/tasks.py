@@ -0,0 +1,24 @@
+"""Фоновые задачи пользователей."""
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mass_mail
+
+from tasks.queue import task
+
+User = get_user_model()
+
+WELCOME_SUBJECT = 'Подтверждение регистрации'
+
+
+@task('users.send_welcome_emails', batch=True, unique=True)
+def send_welcome_emails(batch):
+    """Отправляет приветственные письма зарегистрировавшимся пользователям через одно соединение с почтой."""
+    users = User.objects.filter(pk__in=[user_id for user_id, in batch]).exclude(email='')
+    send_mass_mail([
+        (
+            WELCOME_SUBJECT,
+            f'Дорогой Вы наш {user.username}, поздравляем Вас с регистрацией',
+            None,
+            [user.email],
+        )
+        for user in users
+    ])
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core import mail
@@ -7,6 +7,7 @@ from django.core import mail
 User = get_user_model()
 
 
+@override_settings(TASKS_ASYNC=False)
 class TestSignUp(TestCase):
     """Набор тестов для проверки регистрации нового пользователя."""
 
@@ -1,6 +1,9 @@
+from django.db.models import F
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 
+from posts import invalidation
+from tasks import queue
 from .forms import NewUserForm, ExistingUserForm, UserProfileForm
 from .models import User
 
@@ -15,6 +18,7 @@ def sign_up(request):
             user_profile = profile_form.save(commit=False)
             user_profile.user = user
             user_profile.save()
+            queue.enqueue('users.send_welcome_emails', user.pk)
 
             return redirect(reverse('login'))
 
@@ -37,6 +41,16 @@ def edit_profile(request, username):
 
         if user_form.is_valid() and profile_form.is_valid():
             user_form.save()
+            if 'username' in user_form.changed_data:
+                # имя пользователя входит в ссылки кэшированных карточек и страниц его постов
+                user.posts.update(version=F('version') + 1)
+                group_ids = user.posts.exclude(group=None).values_list('group_id', flat=True).distinct()
+                invalidation.touch(
+                    invalidation.POSTS,
+                    invalidation.author_tag(username),
+                    invalidation.author_tag(user.username),
+                    *(invalidation.group_tag(group_id) for group_id in group_ids)
+                )
             user_profile = profile_form.save(commit=False)
             user_profile.user = user
             user_profile.save()
@@ -0,0 +1,39 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.2 does not speak ASGI natively, so the WSGI application is wrapped with
+the asgiref adapter (pip install asgiref) and served by an ASGI server, e.g.:
+
+    uvicorn yatube.asgi:application --workers 4
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.wsgi import get_wsgi_application
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    raise ImproperlyConfigured('Для запуска по ASGI нужен пакет asgiref: pip install asgiref uvicorn')
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+
+def strip_header_values(wsgi_application):
+    """
+    Убирает пробелы по краям значений заголовков: Django 2.2 передает Set-Cookie с пробелом в начале,
+    серверы WSGI его пропускают, а ASGI-серверы отклоняют такой ответ.
+    """
+    def wrapper(environ, start_response):
+        def strip(status, headers, exc_info=None):
+            return start_response(status, [(name, value.strip()) for name, value in headers], exc_info)
+        return wsgi_application(environ, strip)
+    return wrapper
+
+
+# сервер держит медленные соединения клиентов в цикле событий, а поток из пула адаптера
+# занят только на время работы представления
+application = WsgiToAsgi(strip_header_values(get_wsgi_application()))
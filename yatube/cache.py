@@ -0,0 +1,354 @@
+import math
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class LRUMemoryCache(BaseCache):
+    """
+    Кэш в памяти процесса с ограничением по объему.
+
+    В отличие от LocMemCache ограничивает не количество ключей, а суммарный размер
+    сериализованных значений (параметр MAX_BYTES) и вытесняет давно не использованные ключи.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _get_raw(self, key):
+        """Возвращает сериализованное значение или None. Вызывается под блокировкой."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        raw, expires = item
+        if expires is not None and expires <= time.time():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return raw
+
+    def _set_raw(self, key, raw, timeout):
+        """Сохраняет сериализованное значение, вытесняя старые ключи. Вызывается под блокировкой."""
+        self._remove(key)
+        if len(raw) > self.max_bytes:
+            return
+        self._data[key] = (raw, self.get_backend_timeout(timeout))
+        self._size += len(raw)
+        while self._size > self.max_bytes:
+            self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._size -= len(item[0])
+        return item is not None
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        raw = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._get_raw(key) is not None:
+                return False
+            self._set_raw(key, raw, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            raw = self._get_raw(key)
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        raw = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._set_raw(key, raw, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        with self._lock:
+            raw = self._get_raw(key)
+            if raw is None:
+                return False
+            self._data[key] = (raw, self.get_backend_timeout(timeout))
+            return True
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            self._remove(key)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            return self._get_raw(key) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+
+class RedisCache(BaseCache):
+    """
+    Общий для всех процессов кэш на Redis.
+
+    Клиент создается из LOCATION вызовом CLIENT_CLASS.from_url(); по умолчанию это redis.Redis
+    из пакета redis, который нужен только при использовании этого бэкенда. Для тестов можно
+    подставить любой совместимый по протоколу клиент.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        client_class = options.get('CLIENT_CLASS', 'redis.Redis')
+        try:
+            client_class = import_string(client_class)
+        except ImportError as e:
+            raise ImproperlyConfigured(f'Не удалось загрузить клиент Redis {client_class}: {e}')
+        self._client = client_class.from_url(location)
+
+    @staticmethod
+    def _dumps(value):
+        # целые числа храним как есть, чтобы работали атомарные INCRBY
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(raw):
+        if raw is None:
+            return None
+        if raw[:1] == b'\x80':
+            return pickle.loads(raw)
+        return int(raw)
+
+    def _px(self, timeout):
+        """Переводит время жизни в миллисекунды; 0 и меньше означает, что значение уже устарело."""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else int(timeout * 1000)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        px = self._px(timeout)
+        if px is not None and px <= 0:
+            return not self._client.exists(key)
+        return bool(self._client.set(key, self._dumps(value), px=px, nx=True))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self._loads(self._client.get(key))
+        return default if value is None else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        px = self._px(timeout)
+        if px is not None and px <= 0:
+            self._client.delete(key)
+        else:
+            self._client.set(key, self._dumps(value), px=px)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        px = self._px(timeout)
+        if px is None:
+            return bool(self._client.persist(key))
+        if px <= 0:
+            return bool(self._client.delete(key))
+        return bool(self._client.pexpire(key, px))
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._client.delete(key)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        made_keys = [self.make_key(key, version=version) for key in keys]
+        result = {}
+        for key, raw in zip(keys, self._client.mget(made_keys)):
+            if raw is not None:
+                result[key] = self._loads(raw)
+        return result
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        if keys:
+            self._client.delete(*keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._client.exists(key))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        if not self._client.exists(key):
+            raise ValueError(f"Key '{key}' not found")
+        return self._client.incrby(key, delta)
+
+    def clear(self):
+        self._client.flushdb()
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кэш: ограниченный по объему кэш процесса перед общим кэшем.
+
+    Общий кэш задается псевдонимом из CACHES (параметр SHARED). Значения в памяти процесса
+    живут не дольше LOCAL_TIMEOUT секунд, поэтому удаление ключа другим процессом
+    становится видно с задержкой не больше этого времени. Ключи формируются кэшами
+    обоих уровней, поэтому KEY_PREFIX и VERSION задаются в их настройках.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.local = LRUMemoryCache(None, {'OPTIONS': {'MAX_BYTES': options.get('MAX_BYTES', 16 * 1024 * 1024)}})
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _timeouts(self, timeout):
+        """Возвращает время жизни значения в общем кэше и в кэше процесса."""
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout, self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        shared_timeout, local_timeout = self._timeouts(timeout)
+        if not self.shared.add(key, value, shared_timeout, version=version):
+            return False
+        self.local.set(key, value, local_timeout, version=version)
+        return True
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = self.local.get(key, sentinel, version=version)
+        if value is sentinel:
+            value = self.shared.get(key, sentinel, version=version)
+            if value is sentinel:
+                return default
+            self.local.set(key, value, self.local_timeout, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        result = self.local.get_many(keys, version=version)
+        missing = [key for key in keys if key not in result]
+        if missing:
+            found = self.shared.get_many(missing, version=version)
+            self.local.set_many(found, self.local_timeout, version=version)
+            result.update(found)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        shared_timeout, local_timeout = self._timeouts(timeout)
+        self.shared.set(key, value, shared_timeout, version=version)
+        self.local.set(key, value, local_timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        shared_timeout, local_timeout = self._timeouts(timeout)
+        failed = self.shared.set_many(data, shared_timeout, version=version)
+        self.local.set_many(data, local_timeout, version=version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        shared_timeout, local_timeout = self._timeouts(timeout)
+        self.local.touch(key, local_timeout, version=version)
+        return self.shared.touch(key, shared_timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.local.has_key(key, version=version) or self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+# сколько секунд при промахе ждать значения, которое вычисляет процесс, захвативший блокировку
+COMPUTE_LOCK_TIMEOUT = 10
+COMPUTE_POLL_INTERVAL = 0.05
+
+
+def get_or_compute(key, compute, timeout, beta=1.0, cache_alias='default'):
+    """
+    Возвращает значение из кэша, при необходимости вычисляя его функцией compute.
+
+    Защищает от лавины одновременных пересчетов популярного ключа: значение пересчитывается
+    заранее, до истечения срока хранения, с вероятностью, растущей по мере приближения
+    к этому сроку (алгоритм XFetch), а пересчетом в каждый момент занимается только
+    один процесс, захвативший блокировку. При промахе остальные процессы ждут его значения.
+    """
+    cache = caches[cache_alias]
+    lock_key, token = f'{key}:lock', uuid.uuid4().hex
+    item = cache.get(key)
+    if item is not None:
+        value, delta, expires = item
+        if time.time() - delta * beta * math.log(1 - random.random()) < expires:
+            return value
+        if not cache.add(lock_key, token, max(int(delta) + 1, 1)):
+            # значение пересчитывает другой процесс, пока отдаем текущее
+            return value
+        locked = True
+    else:
+        locked = cache.add(lock_key, token, COMPUTE_LOCK_TIMEOUT)
+        deadline = time.time() + COMPUTE_LOCK_TIMEOUT
+        while not locked and time.time() < deadline:
+            time.sleep(COMPUTE_POLL_INTERVAL)
+            item = cache.get(key)
+            if item is not None:
+                return item[0]
+            locked = cache.add(lock_key, token, COMPUTE_LOCK_TIMEOUT)
+
+    try:
+        start = time.time()
+        value = compute()
+        delta = time.time() - start
+        cache.set(key, (value, delta, time.time() + timeout), timeout)
+    finally:
+        # блокировка могла истечь и достаться другому процессу - снимается только своя
+        if locked and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    return value
@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, connections
+from django.dispatch import receiver
+
+from yatube import db_router
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.CONCURRENT_QUERY_WORKERS, thread_name_prefix='queries')
+        return _executor
+
+
+def execute_wrappers():
+    """Возвращает обертки SQL-запросов, установленные в текущем потоке через execute_wrapper."""
+    return getattr(_local, 'wrappers', ())
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """Устанавливает обертку SQL-запросов на соединения текущего потока и потоков пула, запущенных через start."""
+    wrappers = execute_wrappers()
+    _local.wrappers = wrappers + (wrapper,)
+    try:
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(wrapper))
+            yield
+    finally:
+        _local.wrappers = wrappers
+
+
+def close_after_response(response, stack):
+    """Закрывает stack сразу или, для потокового ответа, по сигналу request_finished после отправки."""
+    if not response.streaming:
+        stack.close()
+        return
+    _local.deferred = getattr(_local, 'deferred', []) + [stack]
+
+
+@receiver(request_started)
+@receiver(request_finished)
+def close_deferred(**kwargs):
+    # request_started закрывает стеки запроса, ответ на который так и не был закрыт
+    deferred, _local.deferred = getattr(_local, 'deferred', []), []
+    with ExitStack() as stack:
+        for item in reversed(deferred):
+            stack.enter_context(item)
+
+
+def run(replicas, wrappers, func, args):
+    close_old_connections()
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(db_router.replica_reads(replicas))
+            for wrapper in wrappers:
+                stack.enter_context(execute_wrapper(wrapper))
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+def start(func, *args):
+    """Запускает func(*args) в пуле потоков и возвращает Future."""
+    # соединения потоков пула не видят незафиксированных изменений транзакции
+    if settings.CONCURRENT_QUERY_WORKERS <= 0 or connection.in_atomic_block:
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return get_executor().submit(run, db_router.replica_reads_enabled(), execute_wrappers(), func, args)
@@ -0,0 +1,38 @@
+"""
+Настройка соединений с базой данных и индексов моделей.
+
+configure_sqlite выполняет для каждого нового соединения с SQLite прагмы из настройки
+SQLITE_PRAGMAS: журнал WAL, размер отображаемой в память части файла и т. п.
+
+Приложения проекта не используют миграции, а migrate --run-syncdb создает только недостающие
+таблицы, поэтому индексы из Meta.indexes, добавленные к существующим моделям, в уже созданную
+базу не попадают. create_missing_indexes добавляет их после каждого migrate.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Выполняет прагмы для нового соединения с SQLite. Подключается к сигналу connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def create_missing_indexes(app_config, using='default', **kwargs):
+    """Создает индексы из Meta.indexes моделей приложения, которых еще нет в базе. Подключается к post_migrate."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for model in app_config.get_models():
+            table = model._meta.db_table
+            if table not in tables or not model._meta.indexes:
+                continue
+            existing = connection.introspection.get_constraints(cursor, table)
+            for index in model._meta.indexes:
+                if index.name not in existing:
+                    # редактор схемы нужен только для построения SQL: в контексте SQLite он требует
+                    # отключить проверку внешних ключей, что невозможно внутри транзакции
+                    cursor.execute(str(index.create_sql(model, connection.schema_editor())))
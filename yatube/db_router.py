@@ -0,0 +1,97 @@
+"""
+Чтение с реплик базы данных.
+
+ReplicaRouter отправляет запись в основную базу default, а чтение во время безопасных (GET, HEAD)
+запросов - в одну из реплик из настройки REPLICA_DATABASES. Чтобы пользователь сразу видел
+свои изменения, ReadYourWritesMiddleware после запроса, который что-то записал в базу, закрепляет
+сессию за основной базой на REPLICA_PIN_SECONDS секунд: пока окно не истекло, чтение в запросах
+этой сессии тоже идет из default. Вне запросов (команды управления, фоновые задачи) чтение всегда
+идет из основной базы.
+
+Сессии и очередь задач всегда читаются из основной базы: по сессиям определяется закрепление,
+а только что созданная сессия может еще не дойти до реплики.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+SESSION_KEY = '_db_pinned_until'
+# приложения, модели которых читаются и пишутся только в основной базе и не закрепляют сессию:
+# задачи ставятся в очередь и при отрисовке страниц, например для создания миниатюр
+PRIMARY_APPS = ('sessions', 'tasks')
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Разрешает внутри блока чтение с реплик. Возвращает состояние блока, в котором
+    отмечается запись в базу: после первой записи блок до конца читает из основной базы.
+    """
+    state = {'replicas': enabled, 'written': False}
+    previous = getattr(_local, 'state', None)
+    _local.state = state
+    try:
+        yield state
+    finally:
+        _local.state = previous
+
+
+def replica_reads_enabled():
+    """Возвращает, разрешено ли сейчас в этом потоке чтение с реплик."""
+    state = getattr(_local, 'state', None)
+    return bool(state and state['replicas'])
+
+
+class ReplicaRouter:
+    """Маршрутизатор, читающий с реплик и пишущий в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        state = getattr(_local, 'state', None)
+        if (
+            state is None
+            or not state['replicas']
+            or not settings.REPLICA_DATABASES
+            or model._meta.app_label in PRIMARY_APPS
+        ):
+            return PRIMARY
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        state = getattr(_local, 'state', None)
+        if state is not None and model._meta.app_label not in PRIMARY_APPS:
+            state['written'] = True
+            state['replicas'] = False
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на репликах те же данные, что и в основной базе
+        return True
+
+
+def is_pinned(request):
+    return request.session.get(SESSION_KEY, 0) > time.time()
+
+
+class ReadYourWritesMiddleware:
+    """Промежуточный слой, выбирающий базу для чтения и закрепляющий сессию после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+
+        enabled = request.method in SAFE_METHODS and not is_pinned(request)
+        with replica_reads(enabled) as state:
+            response = self.get_response(request)
+        if state['written']:
+            request.session[SESSION_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+        return response
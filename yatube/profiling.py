@@ -0,0 +1,180 @@
+"""
+Профилирование запросов в рабочем окружении.
+
+ProfilingMiddleware замеряет каждый PROFILING_SAMPLE_RATE-й по вероятности запрос: количество
+и суммарное время SQL-запросов, время отрисовки шаблонов, время работы с миниатюрами и полное
+время ответа. Замеры пишутся в журнал yatube.profiling одной строкой JSON и накапливаются
+по имени представления в скользящем окне из PROFILING_WINDOW последних замеров, по которому
+страница /__profiling__/ (только для персонала) отдает перцентили.
+
+Статистика хранится в памяти процесса, поэтому при нескольких процессах каждый показывает свою.
+"""
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+from yatube import concurrency
+
+logger = logging.getLogger('yatube.profiling')
+
+METRICS = ('queries', 'sql_ms', 'template_ms', 'thumbnails_ms', 'total_ms')
+PERCENTILES = (50, 95, 99)
+
+_local = threading.local()
+_samples = defaultdict(lambda: deque(maxlen=settings.PROFILING_WINDOW))
+_samples_lock = threading.Lock()
+
+
+def current():
+    """Возвращает замер текущего запроса или None, если запрос не профилируется."""
+    return getattr(_local, 'record', None)
+
+
+@contextmanager
+def recording(record):
+    """Делает record замером текущего запроса на время блока."""
+    _local.record, _local.active = record, set()
+    try:
+        yield
+    finally:
+        _local.record = None
+
+
+@contextmanager
+def timer(name):
+    """
+    Прибавляет время выполнения блока к метрике name_ms текущего замера.
+    Вложенные блоки с тем же именем не учитываются повторно.
+    """
+    record = current()
+    if record is None or name in _local.active:
+        yield
+        return
+    _local.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record[f'{name}_ms'] += (time.perf_counter() - start) * 1000
+        _local.active.discard(name)
+
+
+def timed(name):
+    """Декоратор, замеряющий время выполнения функции как метрику name_ms."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ProfilingTemplate(Template):
+    def render(self, context=None, request=None):
+        with timer('template'):
+            return super().render(context, request)
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """Шаблонизатор Django, замеряющий время отрисовки шаблонов для профилирования."""
+
+    def from_string(self, template_code):
+        return ProfilingTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return ProfilingTemplate(template.template, self)
+
+
+def percentile(values, percent):
+    """Возвращает перцентиль отсортированного списка методом ближайшего ранга."""
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def add_sample(view_name, record):
+    with _samples_lock:
+        _samples[view_name].append(tuple(record[metric] for metric in METRICS))
+
+
+def summary():
+    """Возвращает перцентили всех метрик по каждому представлению."""
+    with _samples_lock:
+        samples = {view_name: list(values) for view_name, values in _samples.items()}
+    result = {}
+    for view_name, values in sorted(samples.items()):
+        stats = {'count': len(values)}
+        for index, metric in enumerate(METRICS):
+            column = sorted(value[index] for value in values)
+            stats[metric] = {f'p{p}': round(percentile(column, p), 2) for p in PERCENTILES}
+        result[view_name] = stats
+    return result
+
+
+def reset():
+    with _samples_lock:
+        _samples.clear()
+
+
+class ProfilingMiddleware:
+    """Промежуточный слой, профилирующий случайную выборку запросов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if current() is not None or random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        record = dict.fromkeys(METRICS, 0)
+        lock = threading.Lock()
+
+        def execute_wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                # запросы выполняются и в потоках пула concurrency
+                with lock:
+                    record['queries'] += 1
+                    record['sql_ms'] += (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            stack.enter_context(recording(record))
+            stack.enter_context(concurrency.execute_wrapper(execute_wrapper))
+            response = self.get_response(request)
+            # потоковый ответ замеряется целиком, вместе с отправкой содержимого
+            stack.callback(self.finish, request, response, record, start)
+            concurrency.close_after_response(response, stack.pop_all())
+        return response
+
+    def finish(self, request, response, record, start):
+        record['total_ms'] = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        add_sample(view_name, record)
+        logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **{metric: round(value, 2) for metric, value in record.items()},
+        }, ensure_ascii=False))
+
+
+@staff_member_required
+def stats(request):
+    return JsonResponse(summary(), json_dumps_params={'ensure_ascii': False})
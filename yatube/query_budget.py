@@ -0,0 +1,97 @@
+"""
+Бюджеты SQL-запросов для представлений.
+
+В настройке QUERY_BUDGETS для имени URL задается максимальное количество SQL-запросов,
+которое может выполнить представление, независимо от количества объектов на странице.
+QueryBudgetMiddleware проверяет бюджет каждого запроса, если включен QUERY_BUDGET_CHECK:
+при превышении он пишет предупреждение в журнал yatube.query_budget, а при QUERY_BUDGET_STRICT
+вызывает исключение. В сообщение попадают повторяющиеся сигнатуры SQL - запросы,
+отличающиеся только параметрами, - по которым обычно и видна проблема N+1.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+
+from yatube import concurrency
+
+logger = logging.getLogger('yatube.query_budget')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)')
+SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def signature(sql):
+    """Возвращает SQL без значений параметров, чтобы одинаковые по структуре запросы совпадали."""
+    sql = sql.replace('%s', '?')
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def duplicates(queries):
+    """Возвращает пары (сигнатура, количество) для сигнатур, встретившихся больше одного раза."""
+    counts = Counter(signature(sql) for sql in queries)
+    return [(sql, count) for sql, count in counts.most_common() if count > 1]
+
+
+@contextmanager
+def record_queries():
+    """
+    Собирает в список тексты всех SQL-запросов, выполненных внутри блока, в том числе в потоках
+    пула concurrency, без параметров.
+    """
+    queries = []
+
+    def execute_wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with concurrency.execute_wrapper(execute_wrapper):
+        yield queries
+
+
+def check(url_name, queries):
+    """Возвращает описание превышения бюджета запросов или None, если бюджет соблюден или не задан."""
+    budget = settings.QUERY_BUDGETS.get(url_name)
+    if budget is None or len(queries) <= budget:
+        return None
+    lines = [f'{url_name}: выполнено {len(queries)} SQL-запросов при бюджете {budget}']
+    lines.extend(f'  {count} раз: {sql}' for sql, count in duplicates(queries))
+    return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware:
+    """Промежуточный слой, проверяющий бюджет SQL-запросов каждого представления."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_CHECK:
+            return self.get_response(request)
+
+        with ExitStack() as stack:
+            queries = stack.enter_context(record_queries())
+            response = self.get_response(request)
+            # потоковый ответ проверяется после отправки содержимого, вместе с запросами при отправке
+            stack.callback(self.finish, request, queries)
+            concurrency.close_after_response(response, stack.pop_all())
+        return response
+
+    def finish(self, request, queries):
+        match = request.resolver_match
+        error = check(match.url_name, queries) if match else None
+        if error:
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(error)
+            logger.warning(error)
@@ -0,0 +1,404 @@
+import asyncio
+import importlib.util
+import json
+import threading
+import time
+
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.apps import apps
+from django.db import connection, router
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from tasks.models import Task
+from yatube import concurrency, database, db_router, profiling
+from yatube.cache import LRUMemoryCache, get_or_compute
+
+
+class FakeRedis:
+    """Заменитель клиента Redis, хранящий данные в памяти процесса."""
+    storage = {}
+
+    @classmethod
+    def from_url(cls, url):
+        return cls()
+
+    def _alive(self, key):
+        item = self.storage.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.time():
+            del self.storage[key]
+            item = None
+        return item
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self.storage[key] = (value, None if px is None else time.time() + px / 1000)
+        return True
+
+    def get(self, key):
+        item = self._alive(key)
+        return item and item[0]
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def exists(self, key):
+        return int(self._alive(key) is not None)
+
+    def delete(self, *keys):
+        return sum(self.storage.pop(key, None) is not None for key in keys)
+
+    def incrby(self, key, amount):
+        value, expires = self._alive(key)
+        self.storage[key] = (str(int(value) + amount).encode(), expires)
+        return int(value) + amount
+
+    def pexpire(self, key, px):
+        item = self._alive(key)
+        if item:
+            self.storage[key] = (item[0], time.time() + px / 1000)
+        return int(bool(item))
+
+    def persist(self, key):
+        item = self._alive(key)
+        if item:
+            self.storage[key] = (item[0], None)
+        return int(bool(item))
+
+    def flushdb(self):
+        self.storage.clear()
+
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'yatube.cache.TieredCache',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_TIMEOUT': 60},
+    },
+    'shared': {
+        'BACKEND': 'yatube.cache.RedisCache',
+        'LOCATION': 'redis://localhost:6379/0',
+        'OPTIONS': {'CLIENT_CLASS': 'yatube.tests.FakeRedis'},
+    },
+}
+
+
+class TestLRUMemoryCache(TestCase):
+    """Набор тестов для проверки кэша процесса с ограничением по объему."""
+
+    def test_eviction(self):
+        """Тестирует вытеснение давно не использованных ключей."""
+        cache = LRUMemoryCache(None, {'OPTIONS': {'MAX_BYTES': 1000}})
+        for i in range(3):
+            cache.set(f'key{i}', 'x' * 300)
+        cache.get('key0')
+        cache.set('key3', 'x' * 300)
+
+        self.assertIn('key0', cache)
+        self.assertNotIn('key1', cache)
+        self.assertIn('key3', cache)
+        self.assertLessEqual(cache._size, 1000)
+
+    def test_timeout(self):
+        """Тестирует истечение срока хранения."""
+        cache = LRUMemoryCache(None, {})
+        cache.set('key', 'value', 0)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'value'))
+        self.assertFalse(cache.add('key', 'other'))
+
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter'), 2)
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TestTieredCache(TestCase):
+    """Набор тестов для проверки двухуровневого кэша."""
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_tiers(self):
+        """Тестирует чтение и запись через оба уровня кэша."""
+        cache, shared = caches['default'], caches['shared']
+        cache.set('key', {'value': 1})
+        self.assertEqual(shared.get('key'), {'value': 1})
+
+        # значение из памяти процесса возвращается без обращения к общему кэшу
+        FakeRedis.storage.clear()
+        self.assertEqual(cache.get('key'), {'value': 1})
+
+        # значения других процессов подтягиваются из общего кэша
+        shared.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(cache.get_many(['key', 'a', 'b', 'c']), {'key': {'value': 1}, 'a': 1, 'b': [2]})
+        self.assertEqual(cache.incr('a', 5), 6)
+        self.assertEqual(cache.get('a'), 6)
+
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'new'))
+        self.assertFalse(cache.add('key', 'newer'))
+
+
+class TestGetOrCompute(TestCase):
+    """Набор тестов для проверки защиты от одновременного пересчета значений."""
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_cached(self):
+        """Тестирует, что свежее значение не пересчитывается."""
+        self.assertEqual(get_or_compute('hot', self.compute, 60), 1)
+        self.assertEqual(get_or_compute('hot', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_early_refresh(self):
+        """Тестирует досрочный пересчет значения, срок хранения которого подходит к концу."""
+        self.cache.set('hot', ('old', 1.0, time.time() + 0.001), 60)
+        self.assertEqual(get_or_compute('hot', self.compute, 60), 1)
+
+        # пока пересчет выполняется другим процессом, возвращается прежнее значение
+        self.cache.set('hot', ('old', 1.0, time.time() + 0.001), 60)
+        self.cache.add('hot:lock', 1)
+        self.assertEqual(get_or_compute('hot', self.compute, 60), 'old')
+        self.assertEqual(self.calls, 1)
+
+    def test_cold_miss(self):
+        """Тестирует, что при промахе значение вычисляет только процесс, захвативший блокировку."""
+        self.cache.add('cold:lock', 'other')
+
+        def computed_elsewhere(seconds):
+            self.cache.set('cold', ('other', 1.0, time.time() + 60), 60)
+
+        with patch('yatube.cache.time.sleep', side_effect=computed_elsewhere):
+            self.assertEqual(get_or_compute('cold', self.compute, 60), 'other')
+        self.assertEqual(self.calls, 0)
+        # чужая блокировка не снимается
+        self.assertEqual(self.cache.get('cold:lock'), 'other')
+
+        self.assertEqual(get_or_compute('free', self.compute, 60), 1)
+        self.assertIsNone(self.cache.get('free:lock'))
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class TestProfiling(TestCase):
+    """Набор тестов для проверки профилирования запросов."""
+
+    def setUp(self):
+        caches['default'].clear()
+        profiling.reset()
+        self.author = get_user_model().objects.create_user('profiler')
+        Post.objects.create(text='замер', author=self.author)
+
+    def test_record(self):
+        """Тестирует замеры запроса в журнале и в статистике по представлениям."""
+        with self.assertLogs('yatube.profiling', 'INFO') as logs:
+            self.client.get(reverse('profile', args=[self.author.username]))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'profile')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['sql_ms'])
+
+        stats = profiling.summary()['profile']
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['queries']['p99'], record['queries'])
+
+    def test_streaming(self):
+        """Тестирует, что замер потокового ответа включает запросы, выполненные при отправке содержимого."""
+        with self.assertLogs('yatube.profiling', 'INFO') as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('feed'))
+            self.assertEqual(profiling.summary(), {})
+            self.assertIn(b'<entry>', b''.join(response.streaming_content))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'feed')
+        self.assertEqual(record['queries'], len(queries))
+        self.assertIsNone(profiling.current())
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_sampling(self):
+        """Тестирует, что запросы вне выборки не замеряются."""
+        self.client.get(reverse('index'))
+        self.assertEqual(profiling.summary(), {})
+
+    def test_stats(self):
+        """Тестирует доступ к перцентилям только для персонала."""
+        response = self.client.get(reverse('profiling'))
+        self.assertEqual(response.status_code, 302)
+
+        self.author.is_staff = True
+        self.author.save()
+        self.client.force_login(self.author)
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('profiling'))
+        self.assertEqual(response.json()['index']['count'], 1)
+        self.assertEqual(set(response.json()['index']['total_ms']), {'p50', 'p95', 'p99'})
+
+    def test_percentile(self):
+        """Тестирует вычисление перцентилей."""
+        values = list(range(1, 101))
+        self.assertEqual(profiling.percentile(values, 50), 50)
+        self.assertEqual(profiling.percentile(values, 99), 99)
+        self.assertEqual(profiling.percentile([7], 95), 7)
+
+
+@override_settings(REPLICA_DATABASES=['replica'], REPLICA_PIN_SECONDS=10)
+class TestReplicaRouter(TestCase):
+    """Набор тестов для проверки чтения с реплик базы данных."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.session = SessionStore()
+        self.middleware = db_router.ReadYourWritesMiddleware(self.view)
+        self.reads = []
+
+    def view(self, request):
+        # представление-заглушка запоминает, откуда читались бы посты, и пишет при POST-запросе
+        self.reads.append(router.db_for_read(Post))
+        if request.method == 'POST':
+            router.db_for_write(Post)
+            self.reads.append(router.db_for_read(Post))
+        return None
+
+    def request(self, method):
+        request = getattr(self.factory, method)('/')
+        request.session = self.session
+        self.middleware(request)
+
+    def test_routing(self):
+        """Тестирует выбор базы для чтения и записи."""
+        self.assertEqual(router.db_for_read(Post), 'default')
+        with db_router.replica_reads() as state:
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertEqual(router.db_for_read(Session), 'default')
+            router.db_for_write(Session)
+            router.db_for_write(Task)
+            self.assertFalse(state['written'])
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertTrue(state['written'])
+            self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_read_your_writes(self):
+        """Тестирует закрепление сессии за основной базой после записи."""
+        self.request('get')
+        self.request('post')
+        self.assertEqual(self.reads, ['replica', 'default', 'default'])
+
+        self.request('get')
+        self.assertEqual(self.reads[-1], 'default')
+        with patch('yatube.db_router.time.time', return_value=time.time() + 11):
+            self.request('get')
+        self.assertEqual(self.reads[-1], 'replica')
+
+
+class TestDatabase(TestCase):
+    """Набор тестов для проверки настройки соединений и индексов базы данных."""
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1024})
+    def test_pragmas(self):
+        """Тестирует выполнение прагм для соединения с SQLite."""
+        database.configure_sqlite(None, connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -1024)
+
+    def test_missing_indexes(self):
+        """Тестирует создание индексов, которых нет в уже существующей базе."""
+        index = Post._meta.indexes[1]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX {index.name}')
+        database.create_missing_indexes(apps.get_app_config('posts'))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Post._meta.db_table)
+        self.assertEqual(constraints[index.name]['columns'], ['group_id', 'pub_date', 'id'])
+
+
+@override_settings(CONCURRENT_QUERY_WORKERS=2)
+class TestConcurrency(SimpleTestCase):
+    """Набор тестов для проверки параллельного выполнения запросов."""
+
+    def test_start(self):
+        """Тестирует выполнение в пуле потоков вместе с выбором реплик и передачу исключений."""
+        with db_router.replica_reads():
+            future = concurrency.start(lambda: (threading.current_thread().name, db_router.replica_reads_enabled()))
+        name, replicas = future.result()
+        self.assertTrue(name.startswith('queries'))
+        self.assertTrue(replicas)
+
+        future = concurrency.start(int, 'не число')
+        with self.assertRaises(ValueError):
+            future.result()
+
+    def test_execute_wrapper(self):
+        """Тестирует, что обертка SQL-запросов текущего потока действует и в потоке пула."""
+        queries = []
+
+        def execute_wrapper(execute, sql, params, many, context):
+            queries.append((threading.current_thread().name, sql))
+            return execute(sql, params, many, context)
+
+        def select():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        with concurrency.execute_wrapper(execute_wrapper):
+            concurrency.start(select).result()
+        concurrency.start(select).result()
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0][0].startswith('queries'))
+        self.assertEqual(queries[0][1], 'SELECT 1')
+
+    def test_atomic(self):
+        """Тестирует последовательное выполнение внутри транзакции."""
+        with patch.object(concurrency.connection, 'in_atomic_block', True):
+            future = concurrency.start(lambda: threading.current_thread().name)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), threading.current_thread().name)
+
+
+@skipUnless(importlib.util.find_spec('asgiref'), 'не установлен пакет asgiref')
+class TestAsgi(TransactionTestCase):
+    """Набор тестов для проверки запуска по ASGI."""
+
+    def test_request(self):
+        """Тестирует ответ приложения из yatube.asgi."""
+        from yatube.asgi import application
+
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': reverse('login'), 'raw_path': reverse('login').encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+        }
+        asyncio.run(application(scope, receive, send))
+        self.assertEqual(messages[0]['type'], 'http.response.start')
+        self.assertEqual(messages[0]['status'], 200)
+        # страница входа ставит cookie csrftoken; ASGI-серверы не принимают значения заголовков
+        # с пробелами по краям
+        self.assertIn(b'set-cookie', [name.lower() for name, value in messages[0]['headers']])
+        for name, value in messages[0]['headers']:
+            self.assertEqual(value, value.strip(), name)
+        self.assertIn(b'csrfmiddlewaretoken', b''.join(message.get('body', b'') for message in messages))
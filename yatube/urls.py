@@ -20,12 +20,16 @@ from django.conf.urls import handler404, handler500
 from django.conf import settings
 from django.conf.urls.static import static
 
+from yatube import profiling
+
 urlpatterns = [
     path('', include('posts.urls')),
     path('auth/', include('users.urls')),
+    path('api/v1/', include('api.urls', namespace='api-v1')),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
     path('about/', include('django.contrib.flatpages.urls')),
+    path('__profiling__/', profiling.stats, name='profiling'),
 ]
 
 urlpatterns += [
@@ -16,5 +16,13 @@ class ImageWidget(forms.ClearableFileInput):
             'width': self.width,
             'height': self.height,
             'role': self.role,
+            'preview': self.get_preview(value),
         })
         return context
+
+    def get_preview(self, value):
+        """Возвращает адрес и srcset заранее созданной миниатюры загруженного изображения в формате WebP."""
+        if not value or not getattr(value, 'instance', None):
+            return None
+        from posts.thumbnails import webp_preview
+        return webp_preview(value, f'{self.width}x{self.height}')